@@ -0,0 +1,145 @@
+"""Aider drivers for the repair loop: one warm in-process session, or a CLI run per pass.
+
+`AiderSession` keeps a single `aider.coders.Coder` alive for the whole build, so Python
+start-up, model setup and the repo map (25k tokens over the whole tree) are paid once; each
+pass only sends its message. Switching between the planning and debug models hands the chat
+history and files over with `Coder.create(from_coder=...)`.
+
+Both drivers take the pass's file scope (see `symbols.SymbolIndex.scope`): those files go
+into the chat and the repo map shrinks to SCOPED_MAP_TOKENS; no scope means the whole repo.
+
+AGITEGEN_AIDER_MODE picks the driver:
+  auto    (default) the session when `aider` is importable here, else the CLI
+  session always the session (error if aider isn't importable)
+  cli     `aider --continue ...` per pass
+"""
+
+from __future__ import annotations
+import importlib.util, os, re, subprocess, sys
+from pathlib import Path
+from .utils import console
+
+MAP_TOKENS = 25000
+SCOPED_MAP_TOKENS = 4096   # when the pass is scoped to a few files, the map is only an overview
+MAX_CHAT_HISTORY = 20000
+
+def _cli_args(files: list[str] | None) -> list[str]:
+    return ["--continue", "--map-tokens", str(SCOPED_MAP_TOKENS if files else MAP_TOKENS),
+            "--max-chat-history", str(MAX_CHAT_HISTORY)]
+
+def aider_mode() -> str:
+    mode = os.getenv("AGITEGEN_AIDER_MODE", "auto").lower()
+    if mode == "auto":
+        return "session" if importlib.util.find_spec("aider") is not None else "cli"
+    return mode if mode in ("session", "cli") else "cli"
+
+class AiderSession:
+    """One Aider chat for the project; `send()` runs one pass and returns its token/cost usage."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.coder = None
+        self.model: str | None = None
+
+    def _coder(self, model: str):
+        from aider.coders import Coder
+        from aider.history import ChatSummary
+        from aider.io import InputOutput
+        from aider.models import Model
+        from aider.repo import GitRepo
+
+        main_model = Model(model)
+        summarizer = ChatSummary([main_model.weak_model, main_model], MAX_CHAT_HISTORY)
+        if self.coder is not None:   # same chat, files and commits; only the model changes
+            return Coder.create(from_coder=self.coder, main_model=main_model, summarizer=summarizer)
+        io = InputOutput(yes=True, pretty=False, fancy_input=False,
+                         input_history_file=str(self.root / ".aider.input.history"),
+                         chat_history_file=str(self.root / ".aider.chat.history.md"))
+        repo = GitRepo(io, [], str(self.root), aider_ignore_file=str(self.root / ".aiderignore"),
+                       models=main_model.commit_message_models())
+        # Mirrors the CLI flags: --continue, --map-tokens, --max-chat-history, repo root as the only arg
+        return Coder.create(main_model=main_model, io=io, repo=repo, fnames=[], map_tokens=MAP_TOKENS,
+                            restore_chat_history=True, summarizer=summarizer)
+
+    def _focus(self, files: list[str] | None):
+        """Make `files` the chat's editable set (dropping last pass's) and size the repo map."""
+        wanted = {self.coder.abs_root_path(f) for f in files or []}
+        for abs_fname in set(self.coder.abs_fnames) - wanted:
+            self.coder.drop_rel_fname(self.coder.get_rel_fname(abs_fname))
+        for f in files or []:
+            self.coder.add_rel_fname(f)
+        if self.coder.repo_map is not None:
+            self.coder.repo_map.max_map_tokens = SCOPED_MAP_TOKENS if files else MAP_TOKENS
+
+    def send(self, model: str, message: str, files: list[str] | None = None) -> dict[str, object]:
+        if self.coder is None or model != self.model:
+            self.coder, self.model = self._coder(model), model
+        self._focus(files)
+        sent, received, cost = self.coder.total_tokens_sent, self.coder.total_tokens_received, self.coder.total_cost
+        self.coder.run(with_message=message)
+        return {"tokens_sent": self.coder.total_tokens_sent - sent,
+                "tokens_received": self.coder.total_tokens_received - received,
+                "cost": self.coder.total_cost - cost}
+
+class AiderCLI:
+    """A cold `aider` process per pass (the CLI may live in its own pipx/uv environment)."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def send(self, model: str, message: str, files: list[str] | None = None) -> dict[str, object]:
+        return _run_aider(["aider", *_cli_args(files), "--model", model, *(files or ["."]), "--message", message],
+                          cwd=self.root)
+
+# Aider's per-message footer, e.g. "Tokens: 12k sent, 1.1k received. Cost: $0.05 message, $0.12 session."
+_AIDER_USAGE = re.compile(r"Tokens: ([\d.,]+[kKmM]?) sent, ([\d.,]+[kKmM]?) received\.(?: Cost: \$([\d.,]+) message)?")
+
+def _count(text: str) -> int:
+    mult = {"k": 1e3, "m": 1e6}.get(text[-1].lower(), 1)
+    return int(float(text.rstrip("kKmM").replace(",", "")) * mult)
+
+def _run_aider(cmd: list[str], cwd: Path | None = None) -> dict[str, object]:
+    """Run Aider like `run_cmd` does, echoing its output and totalling tokens/cost it reports."""
+    shown = " ".join(f"<{len(a)} chars>" if i and cmd[i - 1] == "--message" else a for i, a in enumerate(cmd))
+    console.log(f"[grey]$ {shown}")
+    usage = {"tokens_sent": 0, "tokens_received": 0, "cost": 0.0}
+    try:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, errors="replace", bufsize=1)
+    except FileNotFoundError as e:
+        console.print(f"[yellow]Skipping command – binary not found: {e}")
+        return usage
+    for line in proc.stdout:
+        sys.stdout.write(line)
+        m = _AIDER_USAGE.search(line)
+        if m:
+            usage["tokens_sent"] += _count(m.group(1))
+            usage["tokens_received"] += _count(m.group(2))
+            usage["cost"] += float(m.group(3).replace(",", "")) if m.group(3) else 0.0
+    if proc.wait() != 0:
+        console.print(f"[red]Command failed: {shown}")
+        raise SystemExit(proc.returncode)
+    return usage
+
+class _Fallback:
+    """The session, dropping to the CLI for the rest of the build if it can't be set up."""
+
+    def __init__(self, root: Path):
+        self.session, self.cli = AiderSession(root), AiderCLI(root)
+        self.active = self.session
+
+    def send(self, model: str, message: str, files: list[str] | None = None) -> dict[str, object]:
+        if self.active is self.session and (self.session.coder is None or model != self.session.model):
+            try:
+                self.session.coder, self.session.model = self.session._coder(model), model
+            except Exception as e:
+                console.print(f"[yellow]Aider session unavailable ({e}) – running the aider CLI per pass")
+                self.active = self.cli
+        return self.active.send(model, message, files)
+
+def aider_driver(root: Path):
+    """The driver AGITEGEN_AIDER_MODE asks for; `auto` falls back to the CLI on setup errors."""
+    if aider_mode() == "cli":
+        return AiderCLI(root)
+    explicit = os.getenv("AGITEGEN_AIDER_MODE", "").lower() == "session"
+    return AiderSession(root) if explicit else _Fallback(root)
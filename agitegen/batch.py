@@ -0,0 +1,109 @@
+"""`agitegen build-many`: run the build loop for several projects on a bounded worker pool.
+
+Every project builds in its own `agitegen build --no-ios` process (the loop keeps per-process
+state – cwd, trace, warm services, log dir) with its output in `.agitegen/build.log`.
+Each worker owns one service slot (see `services.SLOT_ENV`) for the build it is running, so
+Supabase containers and emulator ports never collide, while the LLM response, doc and
+quota caches under AGITEGEN_CACHE_DIR are shared by all of them.
+"""
+
+from __future__ import annotations
+import os, queue, re, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from rich.live import Live
+from rich.markup import escape
+from rich.table import Table
+from .services import SLOT_ENV
+from .utils import console, state_dir, terminate_group
+
+BUILD_LOG = "build.log"
+_PASS = re.compile(r"Repair pass \d+/\d+ \(")   # llm.PASS_MARKER, printed once at the start of every pass
+
+@dataclass
+class Job:
+    root: Path
+    status: str = "queued"
+    slot: int | None = None
+    passes: int = 0
+    last: str = ""
+    start: float | None = None
+    end: float | None = None
+    returncode: int | None = None
+    proc: subprocess.Popen | None = None
+
+    @property
+    def log(self) -> Path:
+        return state_dir(self.root) / BUILD_LOG
+
+    def elapsed(self) -> str:
+        if self.start is None:
+            return "-"
+        return f"{(self.end or time.monotonic()) - self.start:.0f}s"
+
+def _build(job: Job, slots: queue.Queue, stop: threading.Event, speculate: int = 0):
+    if stop.is_set():
+        job.status = "cancelled"
+        return
+    slot = slots.get()
+    job.status, job.slot, job.start = "running", slot, time.monotonic()
+    env = {**os.environ, SLOT_ENV: str(slot), "COLUMNS": "120"}
+    try:
+        with open(job.log, "w", encoding="utf-8", errors="replace") as log:
+            job.proc = subprocess.Popen([sys.executable, "-m", "agitegen.cli", "build", "--no-ios",
+                                         *(["--speculate", str(speculate)] if speculate else [])],
+                                        cwd=job.root, env=env, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        text=True, errors="replace", bufsize=1, start_new_session=True)
+            for line in job.proc.stdout:
+                log.write(line)
+                if _PASS.search(line):
+                    job.passes += 1
+                if line.strip():
+                    job.last = line.strip()
+            job.returncode = job.proc.wait()
+        job.status = "green" if job.returncode == 0 else ("cancelled" if stop.is_set() else "failed")
+    except OSError as e:
+        job.status, job.last = "failed", str(e)
+    finally:
+        job.end = time.monotonic()
+        slots.put(slot)
+
+_STYLE = {"queued": "dim", "running": "blue", "green": "green", "failed": "red", "cancelled": "yellow"}
+
+def _table(jobs: list[Job]) -> Table:
+    table = Table(title="agitegen build-many", show_edge=False)
+    for col in ("project", "slot", "status", "pass", "time", "last output"):
+        table.add_column(col, no_wrap=True, overflow="ellipsis")
+    for job in jobs:
+        table.add_row(job.root.name, "-" if job.slot is None else str(job.slot),
+                      f"[{_STYLE[job.status]}]{job.status}", str(job.passes or "-"), job.elapsed(),
+                      escape(job.last[:100]))
+    return table
+
+def build_many(roots: list[Path], jobs: int, speculate: int = 0) -> list[Job]:
+    """Build every root with at most `jobs` concurrent builds; returns the finished jobs."""
+    work = [Job(root) for root in roots]
+    slots: queue.Queue[int] = queue.Queue()
+    for slot in range(1, jobs + 1):   # slot 0 stays with plain `agitegen build`
+        slots.put(slot)
+    stop = threading.Event()
+    with Live(_table(work), console=console, refresh_per_second=4) as live, \
+         ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_build, job, slots, stop, speculate) for job in work]
+        try:
+            while not all(f.done() for f in futures):
+                live.update(_table(work))
+                time.sleep(0.25)
+        except KeyboardInterrupt:
+            stop.set()
+            console.print("[yellow]Interrupted – stopping running builds (their services shut down too)...")
+            for job in work:
+                if job.proc is not None and job.proc.poll() is None:
+                    terminate_group(job.proc)
+        live.update(_table(work))
+    for job in work:
+        if job.status == "failed":
+            console.print(f"[red]{job.root}[/red]: see {job.log}")
+    return work
@@ -0,0 +1,93 @@
+"""Content-addressed on-disk cache for LLM responses, with record/replay modes.
+
+AGITEGEN_LLM_CACHE selects the mode:
+  on     (default) serve byte-identical requests from disk, store new responses
+  off    always hit the network, store nothing
+  record always hit the network and (re)store the response
+  replay serve only recorded responses; a miss is an error and nothing touches the network
+"""
+
+from __future__ import annotations
+import atexit, functools, hashlib, json, os, time
+from pathlib import Path
+from .utils import cache_home, console
+
+MODES = ("on", "off", "record", "replay")
+
+class ResponseCache:
+    """One JSON file per response under `<dir>/<key[:2]>/<key>.json`; mtime doubles as LRU clock."""
+
+    def __init__(self, directory: Path, max_bytes: int, max_age: float):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(model: str, msgs: list[dict]) -> str:
+        blob = json.dumps({"model": model, "messages": msgs}, sort_keys=True,
+                          separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                raise FileNotFoundError(path)
+            value = json.loads(path.read_text())
+            os.utime(path)   # touch: most recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(value))
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Drop entries older than max_age, then least-recently-used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        for path in self.dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+def cache_mode() -> str:
+    mode = os.getenv("AGITEGEN_LLM_CACHE", "on").lower()
+    return mode if mode in MODES else "on"
+
+@functools.lru_cache(maxsize=None)
+def response_cache() -> ResponseCache:
+    cache = ResponseCache(
+        cache_home("llm-cache"),
+        max_bytes=int(float(os.getenv("AGITEGEN_LLM_CACHE_MB", "200")) * 1024 * 1024),
+        max_age=float(os.getenv("AGITEGEN_LLM_CACHE_DAYS", "30")) * 86400,
+    )
+    atexit.register(lambda: (cache.hits or cache.misses) and console.log(
+        f"[grey]LLM cache: {cache.hits} hits / {cache.misses} misses"))
+    return cache
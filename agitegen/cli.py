@@ -2,17 +2,10 @@ from __future__ import annotations
 import os, subprocess, sys, json
 from pathlib import Path
 import typer
-from rich.console import Console
-from rich.panel import Panel
-from .utils import ensure_env, is_mac
-from .quota import ensure_openrouter_quota, ensure_github_minutes, measure_session_cost
-from .scaffolder import scaffold_project, install_backend_deps
-from .llm import collect_requirements, run_aider_until_green
-from .unmet import unmet_requirements
-from .runner import run_local
-from .ios import dispatch_ios_if_needed
-
-console = Console()
+from .utils import console
+
+# Submodules (and their httpx / yaml / jinja2 / chromadb imports) are loaded inside each
+# command so `--help` and light commands don't pay for the heavy ones.
 
 ASCII_BOX_ART = r"""[bold blue]
  ░▒▓██████▓▒░ ░▒▓██████▓▒░░▒▓█▓▒░▒▓████████▓▒░▒▓████████▓▒░▒▓██████▓▒░░▒▓████████▓▒░▒▓███████▓▒░  
@@ -24,16 +17,25 @@ ASCII_BOX_ART = r"""[bold blue]
 ░▒▓█▓▒░░▒▓█▓▒░░▒▓██████▓▒░░▒▓█▓▒░  ░▒▓█▓▒░   ░▒▓████████▓▒░▒▓██████▓▒░░▒▓████████▓▒░▒▓█▓▒░░▒▓█▓▒░
 [/bold blue]"""
 
-console.print(ASCII_BOX_ART)
-
 app = typer.Typer(add_completion=False)
 
+@app.callback()
+def main():
+    console.print(ASCII_BOX_ART)
+
 @app.command()
 def init(
     name: str = typer.Argument(...),
 ):
+    from rich.panel import Panel
+    from .utils import ensure_env
+    from .quota import preflight
+    from .scaffolder import scaffold_project, install_backend_deps
+    from .llm import collect_requirements
+    from .trace import TRACE_FILE, trace_session
+    from .utils import state_dir
     ensure_env("OPENROUTER_API_KEY")
-    ensure_openrouter_quota(); ensure_github_minutes()
+    preflight()   # OpenRouter + GitHub checks run concurrently, cached for a minute
     proj = Path(name).absolute(); proj.mkdir(exist_ok=True)
 
     # --- Interactive Prompts ---
@@ -89,38 +91,147 @@ def init(
 
     # --- End Interactive Prompts ---
 
-    scaffold_project(proj, framework, tlst, backend)
-    install_backend_deps(proj, backend)
+    with trace_session(lambda: state_dir(proj) / TRACE_FILE):
+        scaffold_project(proj, framework, tlst, backend)
+        install_backend_deps(proj, backend)
     reqs = collect_requirements()
     (proj/"requirements.md").write_text(json.dumps({"requirements":reqs}, indent=2))
     console.print(Panel("[green]Scaffold complete! Next steps:\n  1. cd into your project: `cd "+name+"`\n  2. Run the build process: `agitegen build`", 
                       title="Initialization Successful", 
                       border_style="dim blue"))
 
+def _detect_backend(root: Path) -> str:
+    # Detect backend preference – first check env override, else infer from files
+    env_backend = os.getenv("AIDERGEN_BACKEND")
+    return env_backend if env_backend else (
+        "supabase" if (root/"src/backend/supabaseAdapter.ts").exists() else
+        "firebase" if (root/"src/backend/firebaseAdapter.ts").exists() else
+        "none"
+    )
+
+def _speculate_count(value: int) -> int:
+    if value == 1:
+        raise typer.BadParameter("racing needs at least 2 candidates (0 turns speculation off)")
+    return value
+
 @app.command()
-def build():
+def build(
+    ios: bool = typer.Option(True, "--ios/--no-ios", help="Offer to dispatch the iOS workflow once green"),
+    speculate: int = typer.Option(0, "--speculate", min=0, max=4, metavar="N", callback=_speculate_count,
+                                  help="Race N (2-4; 0 = off) repair candidates in git worktrees per failing pass (more spend, less wall time)"),
+):
+    from .quota import measure_session_cost
+    from .llm import run_aider_until_green
+    from .ios import dispatch_ios_if_needed
+    from .services import SLOT_ENV, service_session
+    from .logs import log_session
+    from .trace import TRACE_FILE, trace_session
+    from .utils import state_dir
     root = Path.cwd()
+    # Under build-many the batch's cached reading predates this build, and other builds spend
+    # alongside it: start from a fresh reading and say the figure isn't this build's alone.
+    in_batch = SLOT_ENV in os.environ
+    cost = (measure_session_cost(label="while this build ran (includes concurrent builds)", max_age=0)
+            if in_batch else measure_session_cost())
     try:
         json.loads((root/"requirements.md").read_text())
     except Exception:
         # requirements.md may now contain markdown blocks; ignore parse errors.
         pass
-    # Detect backend preference – first check env override, else infer from files
-    env_backend = os.getenv("AIDERGEN_BACKEND")
-    backend = env_backend if env_backend else (
-        "supabase" if (root/"src/backend/supabaseAdapter.ts").exists() else
-        "firebase" if (root/"src/backend/firebaseAdapter.ts").exists() else
-        "none"
-    )
-    with measure_session_cost():
-        run_aider_until_green(root, backend)
+    backend = _detect_backend(root)
+    # Backend services stay warm across repair passes and stop once here (or on Ctrl-C);
+    # streamed test logs are removed at the same point.
+    with cost, trace_session(state_dir(root) / TRACE_FILE), service_session(), log_session():
+        run_aider_until_green(root, backend, speculate)
+    if not ios:
+        return
     dispatch_ios_if_needed(
         subprocess.check_output(["gh","repo","view","--json","nameWithOwner"], text=True).split('"')[-2],
         subprocess.check_output(["git","rev-parse","HEAD"], text=True).strip()
     )
 
+@app.command("build-many")
+def build_many(
+    roots: list[Path] = typer.Argument(..., exists=True, file_okay=False, resolve_path=True,
+                                       help="Project directories to build"),
+    jobs: int = typer.Option(min(4, os.cpu_count() or 1), "--jobs", "-j", min=1,
+                             help="Builds running at the same time"),
+    speculate: int = typer.Option(0, "--speculate", min=0, max=4, metavar="N", callback=_speculate_count,
+                                  help="Passed on to every build (see `build --speculate`)"),
+):
+    """Build several projects concurrently, each with its own backend ports and log."""
+    from .batch import build_many as run_builds
+    from .quota import measure_session_cost, preflight
+    start = preflight()   # once for the batch, also the start of its spend figure
+    with measure_session_cost(start, label="by the whole batch"):
+        results = run_builds(roots, jobs, speculate)
+    if any(job.status != "green" for job in results):
+        raise typer.Exit(code=1)
+
+@app.command()
+def watch():
+    """Rerun the requirement scan and affected tests on every save; `build` reuses a green result."""
+    from .watch import watch as watch_project
+    root = Path.cwd()
+    watch_project(root, "flutter" if (root / "pubspec.yaml").exists() else "rn", _detect_backend(root))
+
+@app.command()
+def run():
+    """Run the dev server and app runners with prefixed output; Ctrl-C stops them all."""
+    from .runner import run_local
+    run_local()
+
 @app.command()
-def run(): run_local()
+def profile(
+    trace: Path = typer.Argument(None, help="Trace file (default: .agitegen/trace.json of this project)"),
+):
+    """Summarise per-phase timings, tokens and cost recorded by the last build."""
+    from .trace import TRACE_FILE, load_events, print_summary
+    path = trace or Path.cwd() / ".agitegen" / TRACE_FILE
+    if not path.exists():
+        console.print(f"[red]No trace at {path}. Run `agitegen build` first.")
+        raise typer.Exit(code=1)
+    console.print(f"[grey]{path} – open it in chrome://tracing or ui.perfetto.dev for the timeline")
+    print_summary(load_events(path))
+
+templates_app = typer.Typer(help="Local cache of scaffold templates used by `agitegen init`.")
+app.add_typer(templates_app, name="templates")
+
+@templates_app.command("warm")
+def templates_warm(
+    frameworks: list[str] = typer.Argument(None, help="rn, next, flutter-web, flutter-desktop (default: rn)"),
+):
+    """Scaffold and cache the current template for each framework (run while online)."""
+    from .scaffolder import scaffold_command
+    from .templates import warm
+    for framework in frameworks or ["rn"]:
+        if scaffold_command(framework, "x") is None:
+            console.print(f"[red]Unknown framework: {framework}")
+            raise typer.Exit(code=1)
+        entry = warm(framework, lambda name, f=framework: scaffold_command(f, name))
+        if entry is not None:
+            console.print(f"[green]{framework}[/green]: {entry}")
+
+@templates_app.command("list")
+def templates_list():
+    """Show cached templates, newest first."""
+    from datetime import datetime
+    from .templates import entries
+    for e in entries():
+        created = datetime.fromtimestamp(e["created"]).strftime("%Y-%m-%d %H:%M")
+        console.print(f"{e['framework']:<16} {e['version']:<12} {created}  [grey]{e['path']}")
+
+@templates_app.command("prune")
+def templates_prune(
+    keep: int = typer.Option(1, "--keep", min=0, help="Newest entries to keep per framework command"),
+    older_than: float = typer.Option(None, "--older-than", help="Also remove entries older than this many days"),
+):
+    """Remove superseded (and optionally old) templates and half-written leftovers."""
+    from .templates import prune
+    removed = prune(keep, older_than)
+    for path in removed:
+        console.print(f"[grey]removed {path}")
+    console.print(f"[green]{len(removed)} template(s) removed.")
 
 @app.command()
 def add_backend(
@@ -0,0 +1,108 @@
+"""Small thread-pool DAG runner for independent build/test steps."""
+
+from __future__ import annotations
+import threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from rich.table import Table
+from .utils import console
+
+# A step callable receives a cancel event and returns (ok, log). Returning ok=None means
+# "not applicable" (e.g. no backend service available): the step and its dependents are skipped.
+StepFn = Callable[[threading.Event], "tuple[Optional[bool], str]"]
+
+@dataclass
+class Step:
+    name: str
+    run: StepFn
+    deps: tuple[str, ...] = ()
+
+@dataclass
+class StepResult:
+    name: str
+    ok: Optional[bool]          # None = skipped
+    log: str = ""
+    start: float = 0.0
+    end: float = 0.0
+    deps: tuple[str, ...] = field(default_factory=tuple)
+
+    @property
+    def wall(self) -> float:
+        return self.end - self.start
+
+def run_dag(steps: list[Step], fail_fast: bool = False, max_workers: int | None = None,
+            cancel: threading.Event | None = None) -> dict[str, StepResult]:
+    """Run each step as soon as its dependencies succeeded; results keep declaration order.
+
+    With `fail_fast`, the first failure sets every running step's cancel event and nothing
+    new is started. Passing `cancel` lets the caller do the same from outside.
+    """
+    by_name = {s.name: s for s in steps}
+    for s in steps:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"step {s.name!r} depends on unknown step(s) {missing}")
+    cancel = cancel if cancel is not None else threading.Event()
+    results: dict[str, StepResult] = {}
+    pending = list(steps)
+    t0 = time.perf_counter()
+
+    def _call(step: Step) -> StepResult:
+        start = time.perf_counter() - t0
+        try:
+            ok, log = step.run(cancel)
+        except Exception as e:   # a crashing step is a failed step, not a crashed scheduler
+            ok, log = False, f"Error in step {step.name}: {e}"
+        return StepResult(step.name, ok, log, start, time.perf_counter() - t0, step.deps)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(steps))) as pool:
+        running = {}
+        while pending or running:
+            for step in list(pending):
+                dep_results = [results.get(d) for d in step.deps]
+                if cancel.is_set() or any(r is not None and r.ok is not True for r in dep_results):
+                    now = time.perf_counter() - t0
+                    why = "cancelled" if cancel.is_set() else "dependency did not succeed"
+                    results[step.name] = StepResult(step.name, None, f"Skipped: {why}", now, now, step.deps)
+                    pending.remove(step)
+                elif all(r is not None for r in dep_results):
+                    running[pool.submit(_call, step)] = step
+                    pending.remove(step)
+            if not running:
+                if pending:
+                    raise ValueError(f"dependency cycle among steps {[s.name for s in pending]}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                res = fut.result()
+                results[res.name] = res
+                del running[fut]
+                if res.ok is False and fail_fast:
+                    cancel.set()
+    return {s.name: results[s.name] for s in steps}
+
+def critical_path(results: dict[str, StepResult]) -> list[str]:
+    """Chain of steps (following dependencies) that ended last, i.e. what bounded wall time."""
+    ran = [r for r in results.values() if r.end > r.start]
+    if not ran:
+        return []
+    path = [max(ran, key=lambda r: r.end)]
+    while True:
+        deps = [results[d] for d in path[-1].deps if d in results]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda r: r.end))
+    return [r.name for r in reversed(path)]
+
+def print_timings(results: dict[str, StepResult], title: str = "Step timings"):
+    table = Table(title=title, show_edge=False)
+    for col in ("step", "after", "start", "wall", "status"):
+        table.add_column(col, justify="right" if col in ("start", "wall") else "left")
+    for r in results.values():
+        status = "[green]ok" if r.ok else "[dim]skipped" if r.ok is None else "[red]failed"
+        table.add_row(r.name, ",".join(r.deps) or "-", f"{r.start:.1f}s", f"{r.wall:.1f}s", status)
+    console.print(table)
+    path = critical_path(results)
+    if path:
+        console.print(f"[grey]Critical path: {' → '.join(path)} ({results[path[-1]].end:.1f}s)")
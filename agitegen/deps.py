@@ -0,0 +1,197 @@
+"""Content-addressed store of installed `node_modules` trees, keyed by the lockfile.
+
+Generated projects mostly share one dependency set (the same template plus the same backend
+SDKs), so an install done once is reused everywhere: after `npm install` the tree is
+copied into `~/.agitegen/deps/<key>/` and later projects with the same key get it
+hard-linked in (copied across filesystems). The key hashes the dependency fields of
+package.json and the lockfile – both without the project's own name/version – plus the Node
+major version and platform, since native addons are built against them.
+
+`npm_add` records what `npm i <pkgs>` did to a given key (resulting package.json fields and
+lockfile), so `install_backend_deps` on the next project replays it without running npm.
+A miss falls back to `npm install --prefer-offline`, which resolves from npm's shared cache.
+
+Linked files are shared with the store (or with the template cache, for a freshly
+materialized project), so a linked tree is removed (not updated) before npm
+runs in that project again; don't edit files under node_modules in place.
+AGITEGEN_DEPS_STORE=0 turns the store off.
+"""
+
+from __future__ import annotations
+import functools, hashlib, json, os, platform, shutil, subprocess, tempfile, time
+from pathlib import Path
+from .trace import span
+from .utils import cache_home, console, copy_tree, run_cmd, state_dir
+
+STAMP = "node_modules.json"  # in .agitegen/: key of the tree in node_modules, and whether it's linked
+MAX_AGE_DAYS = 30            # snapshots unused for this long are dropped
+NPM_FLAGS = ["--prefer-offline", "--no-audit", "--no-fund"]
+_DEP_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies",
+               "bundleDependencies", "overrides")
+
+def enabled() -> bool:
+    return os.getenv("AGITEGEN_DEPS_STORE", "1") != "0"
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+def _strip_identity(lock: dict) -> dict:
+    """The lockfile without the project's own name/version (they differ per generated app)."""
+    lock = {k: v for k, v in lock.items() if k not in ("name", "version")}
+    if "" in lock.get("packages", {}):
+        top = {k: v for k, v in lock["packages"][""].items() if k not in ("name", "version")}
+        lock["packages"] = {**lock["packages"], "": top}
+    return lock
+
+def _with_identity(lock: dict, pkg: dict) -> dict:
+    ident = {k: pkg[k] for k in ("name", "version") if k in pkg}
+    lock = {**ident, **lock}
+    if "" in lock.get("packages", {}):
+        lock["packages"] = {**lock["packages"], "": {**ident, **lock["packages"][""]}}
+    return lock
+
+def _manifest(root: Path) -> dict:
+    pkg = _read_json(root / "package.json") or {}
+    lock = _read_json(root / "package-lock.json")
+    return {"package": {k: pkg[k] for k in _DEP_FIELDS if k in pkg},
+            "lock": _strip_identity(lock) if lock else None}
+
+@functools.lru_cache(maxsize=1)
+def _runtime() -> str:
+    try:
+        node = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        node = ""
+    return f"node{node.strip().lstrip('v').split('.')[0]}-{platform.system()}-{platform.machine()}".lower()
+
+def lock_key(root: Path) -> str:
+    blob = json.dumps([_manifest(root), _runtime()], sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+def _store() -> Path:
+    return cache_home("deps")
+
+def _stamp(root: Path) -> dict:
+    return _read_json(state_dir(root) / STAMP) or {}
+
+def _set_stamp(root: Path, key: str, linked: bool):
+    (state_dir(root) / STAMP).write_text(json.dumps({"key": key, "linked": linked}))
+
+def _unlink_tree(root: Path):
+    """Drop a node_modules linked from the store before npm modifies it."""
+    if _stamp(root).get("linked"):
+        shutil.rmtree(root / "node_modules", ignore_errors=True)
+
+# -- store -------------------------------------------------------------------------------
+def _link_in(root: Path, key: str) -> bool:
+    entry = _store() / key / "node_modules"
+    if not entry.is_dir():
+        return False
+    shutil.rmtree(root / "node_modules", ignore_errors=True)
+    copy_tree(entry, root / "node_modules", link_all=True)
+    os.utime(entry.parent)   # last use, for pruning
+    return True
+
+def _snapshot(root: Path, key: str):
+    final = _store() / key
+    if final.exists() or not (root / "node_modules").is_dir():
+        return
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=_store()))
+    try:
+        shutil.copytree(root / "node_modules", tmp / "node_modules", symlinks=True)
+        tmp.rename(final)
+    except OSError:   # a concurrent build stored the same key first
+        pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    _prune()
+
+def _prune(max_age_days: float = MAX_AGE_DAYS):
+    cutoff = time.time() - max_age_days * 86400
+    for entry in _store().iterdir():
+        try:
+            if entry.is_dir() and entry.name != "adds" and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue
+
+# -- entry points ---------------------------------------------------------------------------
+def mark_linked(root: Path):
+    """Record a node_modules hard-linked from elsewhere (the template cache) as installed
+    for the current lockfile, so npm never writes into the shared files."""
+    if (root / "node_modules").is_dir():
+        _set_stamp(root, lock_key(root), linked=True)
+
+def ensure_node_modules(root: Path) -> tuple[str, str]:
+    """Make node_modules match package.json/lockfile.
+
+    Returns (result, log): result is "fresh", "hit", "miss", "skip" or "failed", the log is
+    npm's output when the install failed (e.g. an ERESOLVE after package.json was edited).
+    """
+    if not (root / "package.json").exists():
+        return "skip", ""
+    key = lock_key(root)
+    if _stamp(root).get("key") == key and ((root / "node_modules").is_dir() or not _manifest(root)["package"]):
+        return "fresh", ""
+    with span("deps", key=key[:12]) as tags:
+        has_lock = (root / "package-lock.json").exists()
+        if enabled() and has_lock and _link_in(root, key):
+            console.print(f"[grey]node_modules linked from the dependency store ({key[:12]})")
+            tags["result"] = "hit"
+        else:
+            _unlink_tree(root)
+            console.log(f"[grey]$ npm install {' '.join(NPM_FLAGS)}")
+            try:
+                proc = subprocess.run(["npm", "install", *NPM_FLAGS], cwd=root, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True, errors="replace")
+                failed, log = proc.returncode != 0, proc.stdout
+            except OSError as e:
+                failed, log = True, str(e)
+            if failed:
+                console.print("[red]npm install failed[/red]")
+                tags["result"] = "failed"
+                (state_dir(root) / STAMP).unlink(missing_ok=True)   # retried on the next run
+                return "failed", "\n".join(log.splitlines()[-200:])
+            key = lock_key(root)   # npm may have written or updated the lockfile
+            if enabled() and (root / "package-lock.json").exists():
+                _snapshot(root, key)
+            tags["result"] = "miss"
+        _set_stamp(root, key, linked=tags["result"] == "hit")
+    return tags["result"], ""
+
+def npm_add(root: Path, packages: list[str], dev: bool = False):
+    """`npm i [--save-dev] <packages>`, replayed from the store when this exact change was seen."""
+    if not (root / "package.json").exists() or not enabled():
+        run_cmd(["npm", "i", *packages, *(["--save-dev"] if dev else [])], cwd=root)
+        return
+    before = lock_key(root)
+    record = _store() / "adds" / (hashlib.sha256(json.dumps([before, packages, dev]).encode()).hexdigest()[:32] + ".json")
+    with span("deps:add", packages=" ".join(packages)) as tags:
+        done = _read_json(record)
+        pkg = _read_json(root / "package.json")
+        if done is not None and pkg is not None and (_store() / done["key"]).is_dir():
+            for field in _DEP_FIELDS:
+                if field in done["package"]:
+                    pkg[field] = done["package"][field]
+            (root / "package.json").write_text(json.dumps(pkg, indent=2) + "\n")
+            (root / "package-lock.json").write_text(json.dumps(_with_identity(done["lock"], pkg), indent=2) + "\n")
+            if lock_key(root) == done["key"] and _link_in(root, done["key"]):
+                console.print(f"[grey]Added {' '.join(packages)} from the dependency store")
+                _set_stamp(root, done["key"], linked=True)
+                tags["result"] = "hit"
+                return
+        _unlink_tree(root)
+        run_cmd(["npm", "i", *packages, *(["--save-dev"] if dev else []), *NPM_FLAGS], cwd=root)
+        manifest = _manifest(root)
+        after = lock_key(root)
+        if manifest["lock"] is not None:
+            _snapshot(root, after)
+            record.parent.mkdir(exist_ok=True)
+            tmp = record.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({**manifest, "key": after}))
+            os.replace(tmp, record)
+        _set_stamp(root, after, linked=False)
+        tags["result"] = "miss"
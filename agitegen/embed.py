@@ -1,15 +1,20 @@
-"""Download backend docs & embed only relevant chunks with Chroma."""
+"""Download backend docs & embed only relevant chunks with Chroma.
+
+Docs are cached under `~/.agitegen/docs/` and revalidated with ETag / Last-Modified, and
+`embeddings/manifest.json` records which chunks each (doc, keywords) pair produced, so an
+unchanged doc never touches Chroma and new chunks go in as one batched upsert.
+"""
 
 from __future__ import annotations
-import hashlib, httpx, os, re
+import hashlib, httpx, importlib.util, json, os, re
 from pathlib import Path
+from .utils import cache_home, console
 
 _chromadb = None
 
 def _get_chromadb():
     global _chromadb
     if _chromadb is None:
-        import importlib
         _chromadb = importlib.import_module("chromadb")
     return _chromadb
 
@@ -17,17 +22,80 @@ DOC_URLS = {
     "supabase": "https://raw.githubusercontent.com/supabase/docs/main/clients/js/README.md",
     "firebase": "https://raw.githubusercontent.com/firebase/docs/main/docs/web/setup.md",
 }
+MANIFEST = "manifest.json"
+
+def doc_url(backend: str) -> str:
+    """DOC_URLS entry, overridable per backend (e.g. AGITEGEN_DOC_URL_SUPABASE) for local stand-ins."""
+    return os.getenv(f"AGITEGEN_DOC_URL_{backend.upper()}") or DOC_URLS[backend]
+
+def fetch_doc(backend: str) -> str:
+    """The backend doc, from the local cache when the server answers 304 Not Modified."""
+    url = doc_url(backend)
+    cache = cache_home("docs")
+    body_path, meta_path = cache / f"{backend}.md", cache / f"{backend}.json"
+    try:
+        meta = json.loads(meta_path.read_text()) if body_path.exists() else {}
+    except (OSError, ValueError):
+        meta = {}
+    headers = {}
+    if meta.get("url") == url:
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        r = httpx.get(url, headers=headers, timeout=15, follow_redirects=True)
+        if r.status_code == 304 and headers:
+            return body_path.read_text()
+        r.raise_for_status()
+    except httpx.HTTPError as e:
+        if meta.get("url") == url:
+            console.log(f"[yellow]Using cached {backend} docs ({e})")
+            return body_path.read_text()
+        raise
+    # concurrent builds share this cache: write-then-rename so readers never see half a file
+    _write_atomic(body_path, r.text)
+    _write_atomic(meta_path, json.dumps({"url": url, "etag": r.headers.get("etag"),
+                                         "last_modified": r.headers.get("last-modified")}))
+    return r.text
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+def _load_manifest(store_dir: Path) -> dict:
+    try:
+        return json.loads((store_dir / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
 
 def embed_backend(backend: str, keywords: list[str], root: Path):
-    text = httpx.get(DOC_URLS[backend]).text
-    chunks = re.split(r"\n##+\s", text)     # cheap segmenter
+    text = fetch_doc(backend)
     store_dir = root / "embeddings"
     store_dir.mkdir(exist_ok=True)
-    chromadb = _get_chromadb()
-    client = chromadb.PersistentClient(str(store_dir))
-    col = client.get_or_create_collection("docs")
-    for chunk in chunks:
-        if any(k.lower() in chunk.lower() for k in keywords):
-            h = hashlib.sha1(chunk.encode()).hexdigest()
-            if not col.get(ids=[h])["ids"]:
-                col.add(ids=[h], documents=[chunk])
+    manifest = _load_manifest(store_dir)
+    doc_hash = hashlib.sha1(text.encode()).hexdigest()
+    kw = sorted({k.lower() for k in keywords})
+    entry = manifest.get(backend, {})
+    if entry.get("doc") == doc_hash and entry.get("keywords") == kw and (
+            entry.get("chroma") or importlib.util.find_spec("chromadb") is None):
+        return   # same doc, same filter: the collection already holds these chunks
+
+    chunks = re.split(r"\n##+\s", text)     # cheap segmenter
+    wanted = re.compile("|".join(map(re.escape, kw)), re.I) if kw else None
+    relevant = {hashlib.sha1(c.encode()).hexdigest(): c for c in chunks if wanted and wanted.search(c)}
+    try:
+        chromadb = _get_chromadb() if relevant else None
+    except ImportError:
+        console.log("[yellow]chromadb not installed – doc chunks kept for lexical retrieval only")
+        chromadb = None
+    if chromadb is not None:
+        client = chromadb.PersistentClient(str(store_dir))
+        col = client.get_or_create_collection("docs")
+        stored = set(col.get(ids=list(relevant), include=[])["ids"])   # one round-trip
+        new = {h: c for h, c in relevant.items() if h not in stored}
+        if new:
+            col.upsert(ids=list(new), documents=list(new.values()))
+    manifest[backend] = {"doc": doc_hash, "keywords": kw, "chunks": relevant, "chroma": chromadb is not None}
+    tmp = store_dir / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, store_dir / MANIFEST)
@@ -0,0 +1,64 @@
+"""Asyncio stages for the repair loop: blocking work in worker threads, with timeouts.
+
+Each stage runs its (blocking) function via `asyncio.to_thread` inside a trace span on the
+worker thread, so concurrent stages show up as parallel tracks in `trace.json`. A stage that
+overruns STAGE_TIMEOUT either falls back to its `default` (optional work such as doc
+retrieval) or raises StageTimeout; a stage function that accepts a `cancel` event gets one
+that is set on timeout or cancellation, so it can stop its subprocesses.
+"""
+
+from __future__ import annotations
+import asyncio, threading
+from typing import Any, Callable
+from .trace import span
+from .utils import console
+
+# Seconds per stage (None = unbounded). Test commands also have their own per-command limit.
+STAGE_TIMEOUT: dict[str, float | None] = {
+    "unmet_requirements": 300, "run_local_tests": 1800, "index": 120, "scope": 60,
+    "doc_retrieval": 120, "service_prep": 300, "aider": None, "speculate": None,
+}
+
+class StageTimeout(Exception):
+    pass
+
+_REQUIRED = object()
+
+def _traced(name: str, tags: dict, tag_result: bool, fn: Callable, args: tuple, kwargs: dict):
+    with span(name, **tags) as out:
+        result = fn(*args, **kwargs)
+        if tag_result:
+            out.update(result)
+        return result
+
+async def stage(name: str, fn: Callable, *args, default: Any = _REQUIRED, cancellable: bool = False,
+                tags: dict | None = None, tag_result: bool = False, **kwargs) -> Any:
+    """Run `fn(*args, **kwargs)` in a worker thread as stage `name`, bounded by STAGE_TIMEOUT.
+
+    `tag_result` adds the returned dict (e.g. Aider's token usage) to the stage's span.
+    """
+    cancel = threading.Event()
+    if cancellable:
+        kwargs["cancel"] = cancel
+    timeout = STAGE_TIMEOUT.get(name)
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(_traced, name, tags or {}, tag_result, fn, args, kwargs), timeout)
+    except asyncio.TimeoutError:
+        cancel.set()
+        if default is _REQUIRED:
+            raise StageTimeout(f"{name} did not finish within {timeout:.0f}s") from None
+        console.print(f"[yellow]{name} timed out after {timeout:.0f}s – continuing without it")
+        return default
+    except asyncio.CancelledError:
+        cancel.set()   # the thread can't be interrupted, but its subprocesses can
+        raise
+
+async def all_of(*stages):
+    """`asyncio.gather` that cancels the sibling stages as soon as one fails."""
+    tasks = [asyncio.ensure_future(s) for s in stages]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
@@ -0,0 +1,224 @@
+"""Structured failures from test/lint output and token-budgeted Aider repair messages.
+
+`extract_failures` splits the combined log returned by `run_local_tests` into its
+per-command sections, picks a parser from the command (jest, ESLint, `flutter analyze`,
+`flutter test`) and reads the full log file behind each tail line by line.
+`pack_message` then fits unmet symbols, failures and docs into one token budget.
+"""
+
+from __future__ import annotations
+import json, os, re
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Iterator
+from .logs import FULL_LOG_PREFIX, iter_full_log
+
+MAX_STACK = 5            # frames kept per failure
+MAX_MESSAGE_LINES = 12   # lines of assertion/diagnostic text kept per failure
+PROMPT_TOKENS = int(os.getenv("AGITEGEN_PROMPT_TOKENS", "6000"))
+
+@dataclass
+class Failure:
+    tool: str
+    message: str
+    file: str | None = None
+    line: int | None = None
+    test: str | None = None
+    stack: list[str] = field(default_factory=list)
+    count: int = 1           # identical failures folded into this one
+
+    def key(self) -> tuple:
+        return (self.tool, self.file, self.line, self.message.splitlines()[0] if self.message else "")
+
+    def as_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v not in (None, [], "") and not (k == "count" and v == 1)}
+
+_SECTION = re.compile(r"^=== Log for: `(.+)` ===( \[failed\])?$")
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+# -- jest -------------------------------------------------------------------------
+_JEST_HEAD  = re.compile(r"^\s*● (.+)$")
+_JEST_FRAME = re.compile(r"^\s*at .*?\(?((?:/|\.{0,2}/?)[^\s():]+\.[cm]?[jt]sx?):(\d+):\d+\)?$")
+_JEST_END   = re.compile(r"^(PASS|FAIL)\s|^Test Suites:|^Tests:")
+
+def parse_jest(lines: Iterable[str]) -> Iterator[Failure]:
+    cur: Failure | None = None
+    msg: list[str] = []
+    def _done():
+        if cur is not None:
+            cur.message = "\n".join(l.strip() for l in msg if l.strip())[:2000]
+            return cur
+    for raw in lines:
+        line = _ANSI.sub("", raw)
+        head = _JEST_HEAD.match(line)
+        if head or _JEST_END.match(line):
+            done = _done()
+            if done: yield done
+            # `● Console` blocks are console.log output, not failures
+            cur = Failure("jest", "", test=head.group(1).strip()) if head and head.group(1).strip() != "Console" else None
+            msg = []
+            continue
+        if cur is None:
+            continue
+        frame = _JEST_FRAME.match(line)
+        if frame:
+            if "node_modules" in frame.group(1):
+                continue
+            if cur.file is None:
+                cur.file, cur.line = frame.group(1), int(frame.group(2))
+            if len(cur.stack) < MAX_STACK:
+                cur.stack.append(line.strip())
+        elif len(msg) < MAX_MESSAGE_LINES and not cur.stack:
+            msg.append(line)
+    done = _done()
+    if done: yield done
+
+# -- ESLint (stylish formatter) --------------------------------------------------------
+_ESLINT_FILE = re.compile(r"^(/\S+|[A-Za-z]:\\\S+)$")
+_ESLINT_MSG  = re.compile(r"^\s+(\d+):\d+\s+error\s+(.+?)(?:\s{2,}(\S+))?$")
+
+def parse_eslint(lines: Iterable[str]) -> Iterator[Failure]:
+    current = None
+    for raw in lines:
+        line = _ANSI.sub("", raw).rstrip()
+        if _ESLINT_FILE.match(line):
+            current = line
+            continue
+        m = _ESLINT_MSG.match(line)
+        if m and current:
+            rule = f" ({m.group(3)})" if m.group(3) else ""
+            yield Failure("eslint", m.group(2) + rule, current, int(m.group(1)))
+
+# -- flutter analyze ------------------------------------------------------------------
+# `  error • Message • lib/main.dart:12:5 • rule`  (older)  /  `error - lib/main.dart:12:5 - Message - rule`
+_ANALYZE_DOT  = re.compile(r"^\s*(error|warning|info) • (.+?) • (\S+?):(\d+):\d+ • (\S+)\s*$")
+_ANALYZE_DASH = re.compile(r"^\s*(error|warning|info) - (\S+?):(\d+):\d+ - (.+?) - (\S+)\s*$")
+
+def parse_flutter_analyze(lines: Iterable[str]) -> Iterator[Failure]:
+    for line in lines:
+        m = _ANALYZE_DOT.match(line)
+        if m:
+            yield Failure("flutter analyze", f"{m.group(1)}: {m.group(2)} ({m.group(5)})", m.group(3), int(m.group(4)))
+            continue
+        m = _ANALYZE_DASH.match(line)
+        if m:
+            yield Failure("flutter analyze", f"{m.group(1)}: {m.group(4)} ({m.group(5)})", m.group(2), int(m.group(3)))
+
+# -- flutter test -----------------------------------------------------------------
+_FT_PROGRESS = re.compile(r"^\d+:\d+ \+\d+")
+_FT_FAILED   = re.compile(r"^\d+:\d+ \+\d+(?: ~\d+)? -\d+: (?:(\S+\.dart): )?(.+?) \[E\]\s*$")
+_FT_FRAME    = re.compile(r"^((?:test|lib|integration_test)/\S+\.dart) (\d+):\d+\s+(.*)$")
+
+def parse_flutter_test(lines: Iterable[str]) -> Iterator[Failure]:
+    cur: Failure | None = None
+    msg: list[str] = []
+    for raw in lines:
+        line = _ANSI.sub("", raw).rstrip()
+        if _FT_PROGRESS.match(line):
+            if cur is not None:
+                cur.message = "\n".join(msg)[:2000]
+                yield cur
+                cur, msg = None, []
+            m = _FT_FAILED.match(line)
+            if m:
+                cur = Failure("flutter test", "", m.group(1), test=m.group(2))
+            continue
+        if cur is None or not line.strip():
+            continue
+        frame = _FT_FRAME.match(line.strip())
+        if frame:
+            if cur.line is None:
+                cur.file, cur.line = frame.group(1), int(frame.group(2))
+            if len(cur.stack) < MAX_STACK:
+                cur.stack.append(line.strip())
+        elif "package:" in line and line.strip().startswith("package:"):
+            continue   # framework frames
+        elif len(msg) < MAX_MESSAGE_LINES and not line.startswith("═"):
+            msg.append(line.strip())
+    if cur is not None:
+        cur.message = "\n".join(msg)[:2000]
+        yield cur
+
+def _parser_for(cmd: str) -> Callable[[Iterable[str]], Iterator[Failure]] | None:
+    """Parser by executable and subcommand/script name – never by a substring of the
+    arguments, which for narrowed runs are file paths."""
+    words = cmd.split()
+    exe, sub = (words + ["", ""])[:2]
+    if exe in ("flutter", "dart"):
+        return {"analyze": parse_flutter_analyze, "test": parse_flutter_test if exe == "flutter" else None}.get(sub)
+    if exe in ("npm", "yarn"):
+        script = words[2] if sub == "run" and len(words) > 2 else sub
+        return parse_eslint if "lint" in script else parse_jest
+    if exe == "npx":
+        return parse_eslint if sub == "eslint" else parse_jest
+    return None
+
+def _sections(test_log: str) -> Iterator[tuple[str, bool, str]]:
+    """(command, failed?, body) per `=== Log for: ... ===` section of a combined log."""
+    cmd, failed, body = None, False, []
+    for line in test_log.splitlines():
+        m = _SECTION.match(line)
+        if m:
+            if cmd is not None:
+                yield cmd, failed, "\n".join(body)
+            cmd, failed, body = m.group(1), bool(m.group(2)), []
+        elif cmd is not None:
+            body.append(line)
+    if cmd is not None:
+        yield cmd, failed, "\n".join(body)
+
+def dedupe(failures: Iterable[Failure]) -> list[Failure]:
+    seen: dict[tuple, Failure] = {}
+    for f in failures:
+        if f.key() in seen:
+            seen[f.key()].count += 1
+        else:
+            seen[f.key()] = f
+    return list(seen.values())
+
+def extract_failures(test_log: str) -> tuple[list[Failure], dict[str, str]]:
+    """(deduplicated failures, {command: tail} for failing sections no parser understood)."""
+    failures: list[Failure] = []
+    unparsed: dict[str, str] = {}
+    for cmd, failed, body in _sections(test_log):
+        if not failed:
+            continue
+        parser = _parser_for(cmd)
+        found = list(parser(iter_full_log(body))) if parser else []
+        failures += found
+        if not found:
+            unparsed[cmd] = "\n".join(l for l in body.splitlines()[-30:] if not l.startswith(FULL_LOG_PREFIX))
+    return dedupe(failures), unparsed
+
+# -- token budget -------------------------------------------------------------------
+def estimate_tokens(text: str) -> int:
+    """~4 chars/token – close enough for budgeting across the Gemini/o3 tokenizers."""
+    return len(text) // 4 + 1
+
+def pack_message(unmet: list[str], failures: list[Failure], unparsed: dict[str, str],
+                 docs: list[str], budget: int = PROMPT_TOKENS) -> dict[str, object]:
+    """Fill the `--message` payload in priority order until the shared token budget is spent.
+
+    Unmet symbols first, then structured failures, then raw tails of unparsed failing
+    steps, then docs. Whatever does not fit is summarised by a count.
+    """
+    msg: dict[str, object] = {}
+    left = budget
+
+    def _take(key: str, items: list, render=lambda x: x):
+        nonlocal left
+        kept = []
+        for item in items:
+            cost = estimate_tokens(json.dumps(render(item)))
+            if cost > left:
+                break
+            kept.append(render(item)); left -= cost
+        if kept:
+            msg[key] = kept
+        if len(kept) < len(items):
+            msg[f"{key}_omitted"] = len(items) - len(kept)
+
+    _take("unmet", unmet)
+    _take("failures", failures, Failure.as_dict)
+    _take("failing_output", [{"command": c, "tail": t} for c, t in unparsed.items()])
+    _take("docs", docs)
+    return msg
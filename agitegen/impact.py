@@ -0,0 +1,133 @@
+"""Test impact analysis between repair passes: rerun only failed and affected tests.
+
+`TestImpact` remembers the working-tree snapshot each test run saw and which tests or
+files failed in it. For the next run it diffs the tree against that snapshot and narrows
+each step (lint / unit / integration) to the changed files plus the previous failures.
+Anything it cannot reason about – no git, config changes, a step that failed without
+naming a file – falls back to running that step in full.
+"""
+
+from __future__ import annotations
+import os, re, shutil, subprocess, tempfile
+from pathlib import Path, PurePosixPath
+from .logs import iter_full_log
+
+JS_EXT   = {".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"}
+# Changing any of these can affect every test, so they force a full run.
+GLOBAL_FILES = re.compile(
+    r"(^|/)(package(-lock)?\.json|yarn\.lock|pnpm-lock\.yaml|tsconfig[^/]*\.json|babel\.config\.\w+|"
+    r"jest\.config\.\w+|\.eslintrc[^/]*|eslint\.config\.\w+|app\.json|metro\.config\.\w+|"
+    r"pubspec\.(yaml|lock)|analysis_options\.yaml)$")
+BACKEND_PATHS = re.compile(r"(^|/)(src/backend/|integration_test/|lib/backend/)|\.int\.test\.|\.env")
+
+_JEST_FAIL    = re.compile(r"^\s*FAIL\s+(\S+)")
+_ESLINT_FILE  = re.compile(r"^(/\S+\.(?:[cm]?[jt]sx?))\s*$")
+_FLUTTER_FAIL = re.compile(r"(\S+_test\.dart)(?::\d+:\d+)?: .*\[E\]\s*$")
+
+def snapshot(root: Path) -> str | None:
+    """Tree hash of the whole working tree (tracked + untracked, minus ignored).
+
+    Built in a throwaway copy of the index so the user's staging area is never touched.
+    """
+    try:
+        git_dir = subprocess.run(["git", "rev-parse", "--absolute-git-dir"], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        with tempfile.TemporaryDirectory() as tmp:
+            index = Path(tmp) / "index"
+            if (Path(git_dir) / "index").exists():
+                shutil.copyfile(Path(git_dir) / "index", index)   # reuse its stat cache
+            env = {**os.environ, "GIT_INDEX_FILE": str(index)}
+            subprocess.run(["git", "add", "-A", "."], cwd=root, env=env, capture_output=True, check=True)
+            return subprocess.run(["git", "write-tree"], cwd=root, env=env, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def changed_between(root: Path, old: str, new: str) -> list[str] | None:
+    try:
+        out = subprocess.run(["git", "diff", "--name-only", "--no-renames", old, new], cwd=root,
+                             capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [line for line in out.splitlines() if line]
+
+def failing_files(step: str, log: str, root: Path) -> list[str]:
+    """Project-relative files a failed step's output blames (test files or linted files)."""
+    rx = _ESLINT_FILE if step == "lint" else _FLUTTER_FAIL if (root / "pubspec.yaml").exists() else _JEST_FAIL
+    found = [m.group(1) for m in map(rx.search, iter_full_log(log)) if m]   # streamed, not slurped
+    rels = []
+    for f in found:
+        p = Path(f)
+        if p.is_absolute():
+            try:
+                p = p.relative_to(root)
+            except ValueError:
+                continue
+        rels.append(p.as_posix())
+    return sorted(set(rels))
+
+class TestImpact:
+    """Carries test state across passes of one build; see the module docstring."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.tree: str | None = None                 # snapshot the last run tested
+        self.failed: dict[str, list[str] | None] = {} # step -> failing files (None = unknown, rerun all)
+        self._pending_tree: str | None = None
+        self.confirmed = False                       # last run was the full suite, not a narrowed one
+
+    def plan(self, framework: str, commands: dict[str, list[str]]) -> dict[str, list[str] | None] | None:
+        """Narrowed command per step (None = skip it), or None when a full run is needed."""
+        self._pending_tree = snapshot(self.root)
+        if self.tree is None or self._pending_tree is None:
+            return None
+        changed = changed_between(self.root, self.tree, self._pending_tree)
+        if changed is None or any(GLOBAL_FILES.search(f) for f in changed):
+            return None
+        changed = [f for f in changed if (self.root / f).exists()]   # deleted files can't be re-run
+        plan: dict[str, list[str] | None] = {}
+        for step, cmd in commands.items():
+            prev = self.failed.get(step, [])
+            if prev is None:
+                plan[step] = cmd          # failed without naming files: rerun it whole
+            elif step == "integration":
+                plan[step] = cmd if prev or any(BACKEND_PATHS.search(f) for f in changed) else None
+            elif framework == "flutter":
+                plan[step] = self._flutter(step, cmd, changed, prev)
+            else:
+                plan[step] = self._js(step, cmd, changed, prev)
+        return plan
+
+    def _js(self, step: str, cmd: list[str], changed: list[str], prev: list[str]) -> list[str] | None:
+        files = sorted({f for f in changed if PurePosixPath(f).suffix in JS_EXT} | set(prev))
+        if not files:
+            return None
+        if step == "lint":
+            return ["npx", "eslint", "--no-error-on-unmatched-pattern", *files]
+        # jest maps sources to the tests that import them; test files map to themselves
+        return [*cmd, "--", "--findRelatedTests", *files, "--passWithNoTests"]
+
+    def _flutter(self, step: str, cmd: list[str], changed: list[str], prev: list[str]) -> list[str] | None:
+        dart = [f for f in changed if f.endswith(".dart")]
+        if step == "lint":
+            return cmd if dart else None   # `flutter analyze` is project-wide and incremental already
+        tests = set(prev) | {f for f in dart if f.startswith("test/") and f.endswith("_test.dart")}
+        for f in dart:
+            if f.startswith("lib/"):
+                guess = "test/" + f[len("lib/"):-len(".dart")] + "_test.dart"
+                if (self.root / guess).exists():
+                    tests.add(guess)
+        return [*cmd, *sorted(tests)] if tests else None
+
+    def record(self, results: dict, partial: bool):
+        """Remember what this run tested and which files failed, for the next plan()."""
+        self.tree = self._pending_tree or snapshot(self.root)
+        self.confirmed = not partial
+        for name, res in results.items():
+            if name == "backend" or (res.ok is None and partial):
+                continue   # skipped in a narrowed run: previous state still stands
+            if res.ok is False:
+                files = failing_files(name, res.log, self.root)
+                self.failed[name] = files or None
+            else:
+                self.failed[name] = []
@@ -1,38 +1,242 @@
 """OpenRouter chat + Aider orchestration."""
 
 from __future__ import annotations
-import json, os, time
+import asyncio, atexit, functools, json, os, re, sys, time
 import yaml
 from pathlib import Path
-import httpx, subprocess, shutil, tempfile
+from typing import Callable
+import httpx, subprocess, shutil
 from rich.console import Console
-from .embed import embed_backend
+from .aider_session import aider_driver
+from .cache import cache_mode, response_cache
+from .engine import all_of, stage
 from .unmet import unmet_requirements
-from .tester import run_local_tests
-from .utils import run_cmd
+from .failures import estimate_tokens, extract_failures, pack_message
+from .impact import TestImpact
+from .retrieval import retriever
+from .speculate import race
+from .symbols import SymbolIndex
+from .trace import set_tags, span
+from .tester import prepare_backend, run_local_tests
+from .watch import known_state
 
 console = Console()
 
 PLANNING_MODEL = "google/gemini-2.5-pro-preview-03-25"
 DEBUG_MODEL    = "openai/o3"
-ORIGIN         = "https://openrouter.ai/api/v1/chat/completions"
-
-def _chat(model: str, msgs: list[dict[str,str]]):
-    r = httpx.post(
-        ORIGIN,
-        headers={
-            "Authorization": f"Bearer {os.environ['OPENROUTER_API_KEY']}",
-            "Content-Type": "application/json",
-        },
-        json={"model": model, "messages": msgs},
-        timeout=120,
+PASS_MARKER    = "Repair pass"
+ORIGIN         = os.getenv("AGITEGEN_OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Read timeout is per chunk when streaming, so long generations no longer hit a flat 120 s cap.
+TIMEOUT        = httpx.Timeout(120, connect=10)
+
+@functools.lru_cache(maxsize=None)
+def _client() -> httpx.Client:
+    """Process-wide keep-alive client; AGITEGEN_HTTP2=1 opts into HTTP/2 (needs `h2`)."""
+    http2 = os.getenv("AGITEGEN_HTTP2") == "1"
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            console.log("[yellow]AGITEGEN_HTTP2 set but `h2` is not installed – using HTTP/1.1")
+            http2 = False
+    client = httpx.Client(
+        http2=http2, timeout=TIMEOUT,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=90),
     )
+    atexit.register(client.close)
+    return client
+
+def _headers() -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {os.environ['OPENROUTER_API_KEY']}",
+        "Content-Type": "application/json",
+    }
+
+def _stdout(text: str):
+    sys.stdout.write(text); sys.stdout.flush()
+
+def _stream(body: dict, echo: bool | Callable[[str], None]) -> dict:
+    """POST with `stream: true` and assemble the SSE deltas, echoing tokens as they arrive
+    (to stdout, or through `echo` when it is a callable)."""
+    write = echo if callable(echo) else _stdout
+    t0 = time.perf_counter(); ttft = None
+    parts: list[str] = []; usage = None
+    # `usage.include` makes OpenRouter send exact token counts in the final chunk
+    with _client().stream("POST", ORIGIN, headers=_headers(), json={**body, "stream": True, "usage": {"include": True}}) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line.startswith("data:"):
+                continue   # blank separators and keep-alive comments (": OPENROUTER PROCESSING")
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                raise RuntimeError(f"OpenRouter stream error: {chunk['error'].get('message', chunk['error'])}")
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(delta)
+                if echo:
+                    write(delta)
+    if echo:
+        print()
+    total = time.perf_counter() - t0
+    console.log(f"[grey]{body['model']}: first token {ttft if ttft is not None else total:.2f}s, done in {total:.2f}s")
+    return {"content": "".join(parts).strip(), "usage": usage}
+
+def _fetch(model: str, msgs: list[dict[str,str]], stream: bool, echo: bool | Callable[[str], None]) -> dict:
+    body = {"model": model, "messages": msgs}
+    if stream:
+        return _stream(body, echo)
+    r = _client().post(ORIGIN, headers=_headers(), json=body)
     r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"].strip()
+    data = r.json()
+    return {"content": data["choices"][0]["message"]["content"].strip(), "usage": data.get("usage")}
+
+def _request(model: str, msgs: list[dict[str,str]], stream: bool = False,
+             echo: bool | Callable[[str], None] = True) -> dict:
+    """Chat completion through the response cache (see `cache.py` for AGITEGEN_LLM_CACHE modes)."""
+    mode = cache_mode()
+    if mode == "off":
+        return _fetch(model, msgs, stream, echo)
+    cache = response_cache()
+    key = cache.key(model, msgs)
+    if mode in ("on", "replay"):
+        hit = cache.get(key)
+        if hit is not None:
+            if stream and echo:
+                (echo if callable(echo) else _stdout)(hit["content"]); print()
+            return hit
+        if mode == "replay":
+            console.print(f"[red]❌  No recorded response for {model} (key {key[:12]}) in replay mode")
+            raise SystemExit(1)
+    result = _fetch(model, msgs, stream, echo)
+    cache.put(key, result)
+    return result
+
+def _chat(model: str, msgs: list[dict[str,str]], stream: bool = False):
+    return _request(model, msgs, stream=stream)["content"]
+
+INTERVIEW_TOKENS = int(os.getenv("AGITEGEN_INTERVIEW_TOKENS", "4000"))   # history size that triggers compaction
+KEEP_TURNS = 2   # latest question/answer exchanges kept verbatim after compaction
+SPEC_INSTRUCTIONS = (
+    "After each reply, add a ```yaml block with what the user's latest answer added or changed: "
+    "`app: <one-line description>` if it changed, `requirements:` items {symbol:<short code identifier>, "
+    "desc:<text>} (`remove: true` drops one), and `notes:` – short statements of every other decision or "
+    "fact given (backend choice, data tables/collections and their fields, platforms, constraints). "
+    "Leave the block out if nothing changed.")
+_YAML_BLOCK = re.compile(r"```ya?ml\s*\n(.*?)```", re.S)
+_FENCE_OPEN = re.compile(r"^```ya?ml\s*$")
+_SYMBOL = re.compile(r"^[A-Za-z_$][\w$.]*$")
+
+class _HideSpec:
+    """Echo for streamed interview replies that leaves out the ```yaml spec blocks (they
+    feed the merge, not the user). Text is held back only while a line could still be a fence."""
+
+    def __init__(self):
+        self.buf, self.hiding, self.visible = "", False, False
+
+    def __call__(self, delta: str):
+        self.buf += delta
+        while self.buf:
+            nl = self.buf.find("\n")
+            if self.visible:   # the rest of a line already known to be plain text
+                end = len(self.buf) if nl < 0 else nl + 1
+                _stdout(self.buf[:end]); self.buf = self.buf[end:]
+                self.visible = nl < 0
+                continue
+            line = (self.buf if nl < 0 else self.buf[:nl]).strip()
+            if nl < 0 and (self.hiding or line.startswith("```") or "```".startswith(line)):
+                return   # wait for the rest of the line
+            if self.hiding or _FENCE_OPEN.match(line):   # a spec line: drop it
+                self.hiding = not self.hiding or not line.startswith("```")
+                self.buf = self.buf[nl + 1:]
+                continue
+            self.visible = True
+
+    def flush(self):
+        if not self.hiding and self.buf:
+            _stdout(self.buf + "\n")
+        self.buf, self.hiding, self.visible = "", False, False
+
+class _Interview:
+    """The requirement chat with a bounded prompt and a spec that grows with every answer.
+
+    Each reply carries a YAML delta that is validated and merged into `spec` at once. Once the
+    exact size of the last exchange (prompt + completion tokens, as reported by the API) passes
+    INTERVIEW_TOKENS, older turns are folded into one message holding the spec so far – the
+    requirements plus notes on every other decision (backend, tables, …) – so every later
+    request stays about that size however long the interview runs.
+    """
+
+    def __init__(self, head: list[dict[str, str]]):
+        self.head = head
+        self.turns: list[dict[str, str]] = []
+        self.app = ""
+        self.spec: dict[str, dict] = {}   # symbol -> {symbol, desc}
+        self.notes: list[str] = []        # everything else the user decided (backend, tables, …)
+        self.compacted = False
+
+    def messages(self) -> list[dict[str, str]]:
+        summary = []
+        if self.compacted:
+            summary = [{"role": "system", "content": "Interview so far (older turns compacted):\n" +
+                        yaml.safe_dump({"app": self.app, "notes": self.notes,
+                                        "requirements": list(self.spec.values())}, sort_keys=False)}]
+        return self.head + summary + self.turns
+
+    def ask(self, answer: str) -> str:
+        self.turns.append({"role": "user", "content": answer})
+        msgs = self.messages()
+        echo = _HideSpec()
+        result = _request(PLANNING_MODEL, msgs, stream=True, echo=echo)   # printed as tokens arrive
+        echo.flush()
+        self.turns.append({"role": "assistant", "content": result["content"]})
+        self.merge(result["content"])
+        usage = result.get("usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            tokens = usage["prompt_tokens"] + (usage.get("completion_tokens") or 0)
+        else:   # provider sent no usage: estimate
+            tokens = estimate_tokens(json.dumps(msgs) + result["content"])
+        console.log(f"[grey]interview: {tokens} tokens this turn, {len(self.spec)} requirement(s) so far")
+        if tokens > INTERVIEW_TOKENS and len(self.turns) > 2 * KEEP_TURNS:
+            self.turns = self.turns[-2 * KEEP_TURNS:]
+            self.compacted = True
+        return result["content"]
+
+    def merge(self, reply: str):
+        for block in _YAML_BLOCK.findall(reply):
+            try:
+                delta = yaml.safe_load(block)
+            except yaml.YAMLError as e:
+                console.log(f"[yellow]Ignoring malformed spec update: {e}")
+                continue
+            if not isinstance(delta, dict):
+                continue
+            if isinstance(delta.get("app"), str) and delta["app"].strip():
+                self.app = delta["app"].strip()
+            notes = delta.get("notes") or []
+            for note in notes if isinstance(notes, list) else [notes]:
+                text = note if isinstance(note, str) else yaml.safe_dump(note, default_flow_style=True).strip()
+                if text.strip() and text.strip() not in self.notes:
+                    self.notes.append(text.strip())
+            for item in delta.get("requirements") or []:
+                sym = str(item.get("symbol", "")).strip() if isinstance(item, dict) else ""
+                if not _SYMBOL.match(sym):
+                    console.log(f"[yellow]Ignoring requirement without a usable symbol: {item!r}")
+                elif item.get("remove"):
+                    self.spec.pop(sym, None)
+                elif isinstance(item.get("desc"), str) and item["desc"].strip():
+                    self.spec[sym] = {"symbol": sym, "desc": item["desc"].strip()}
 
 def collect_requirements() -> list[dict]:
-    msgs = [
-        {"role": "system", "content": "Ask clarifying questions. User will type DONE when finished."},
+    interview = _Interview([
+        {"role": "system", "content": "Ask clarifying questions. User will type DONE when finished.\n" + SPEC_INSTRUCTIONS},
         {"role": "assistant", "content": "Describe your app in one sentence."},
         {
             "role": "assistant",
@@ -41,81 +245,109 @@ def collect_requirements() -> list[dict]:
                 "If you might switch or add others later, list them all.\n"
                 "For each one, describe the data tables / collections you foresee."),
         },
-    ]
+    ])
     while True:
         user = input("🙋 ").strip()
-        msgs.append({"role":"user","content":user})
         if user.lower()=="done": break
-        reply = _chat(PLANNING_MODEL,msgs)
-        print(reply); msgs.append({"role":"assistant","content":reply})
+        interview.ask(user)
+    if interview.spec:
+        reqs = list(interview.spec.values())
+        console.print(yaml.safe_dump({"requirements": reqs}, sort_keys=False))
+        return reqs
+    # Nothing came through the incremental updates: one extraction over the (compacted) history
+    msgs = interview.messages() + [{"role":"user","content":"DONE"}]
     spec = _chat(PLANNING_MODEL,msgs+[{"role":"assistant","content":"Now output YAML list under key `requirements` where each item is {symbol:<short>, desc:<text>}."}])
     console.print(spec)
     # Parse the YAML-formatted specs into Python and return the list
-    parsed = yaml.safe_load(spec)
-    if isinstance(parsed, dict):
-        reqs = parsed.get("requirements", [])
-        if isinstance(reqs, list):
-            return reqs
+    interview.merge(spec if _YAML_BLOCK.search(spec) else f"```yaml\n{spec}\n```")
+    if interview.spec:
+        return list(interview.spec.values())
     # Fallback: no valid requirements list detected
     console.print("[yellow]No valid YAML requirements list produced; continuing without explicit requirements.")
     return []
 
-def run_aider_until_green(root: Path, backend: str):
+def run_aider_until_green(root: Path, backend: str, speculate: int = 0):
     """Iterate with Aider until there are no unmet symbols **and** the local test suite passes.
 
-    At most 5 passes – first with the planning model, subsequent with the debug model.
+    At most 5 passes – first with the planning model, subsequent with the debug model,
+    all sent to the same Aider session (see `aider_session`).
+    Within a pass, independent stages run concurrently (see `engine.py`): the requirement scan,
+    the test run and the symbol index refresh; then doc retrieval and file scoping; and while
+    Aider edits, the warm backend service is readied for the next pass's integration tests.
+    With `speculate` >= 2, each repair races that many candidates in git worktrees and keeps
+    the first green one (see `speculate.py`); a round counts as one pass. If `agitegen watch`
+    recorded this exact working tree as green, nothing runs at all.
+    Every stage runs inside a trace span tagged with the pass number and model.
     """
+    asyncio.run(_until_green(root, backend, speculate))
+
+async def _until_green(root: Path, backend: str, speculate: int = 0):
     passes = 0
-    while passes < 5:
-        unmet = unmet_requirements(root)
-        # Determine framework based on existing files (simplified logic, might need refinement)
-        framework = "flutter" if (root / "pubspec.yaml").exists() else "rn"
-        tests_ok, test_log = run_local_tests(root, framework, backend)
-        # If everything is green, we're done
-        if not unmet and tests_ok:
-            console.print("[green]✅ Local tests passed and no unmet symbols – build is green!")
-            return
-
-        # Build the message for Aider summarising unmet requirements and failing tests
-        msg_dict: dict[str, object] = {}
-        if unmet:
-            msg_dict["unmet"] = unmet
-        if not tests_ok:
-            # Save failing log to a temp file for easier reference and include a summary snippet
-            tmp_log_file = tempfile.NamedTemporaryFile(delete=False, suffix="_aider_fail.log", mode="w", encoding="utf-8")
-            tmp_log_file.write(test_log)
-            tmp_log_file.close()
-            # only send the tail 100 lines to avoid context bloat
-            tail = "\n".join(test_log.splitlines()[-100:])
-            msg_dict["failing_tests_tail"] = tail
-        # Add backend docs snippet (max 3 chunks) if applicable
-        docs = _get_backend_docs(root, backend) if backend != "none" else []
-        if docs:
-            msg_dict["docs"] = docs[:3]
-
-        model = DEBUG_MODEL if passes else PLANNING_MODEL
-        run_cmd([
-            "aider", "--continue", "--map-tokens", "25000", "--max-chat-history", "20000",
-            "--model", model,
-            "--message", json.dumps(msg_dict), ".",
-        ])
-        passes += 1
+    impact = TestImpact(root)   # later passes rerun only failed + affected tests first
+    aider = aider_driver(root)  # one warm Aider session for every pass when aider is importable
+    symbols = SymbolIndex(root) # refreshed incrementally each pass
+    prep = None                 # service warm-up overlapping the previous pass's Aider run
+    known = known_state(root, "flutter" if (root / "pubspec.yaml").exists() else "rn", backend)
+    if known is not None and known["green"]:
+        console.print("[green]✅ `agitegen watch` already saw this exact tree green – nothing to do.")
+        return
+    try:
+        while passes < 5:
+            model = DEBUG_MODEL if passes else PLANNING_MODEL
+            set_tags(pass_no=passes + 1, model=model)
+            console.print(f"{PASS_MARKER} {passes + 1}/5 ({model})", style="bold blue")   # counted by build-many
+            with span("pass"):
+                # Determine framework based on existing files (simplified logic, might need refinement)
+                framework = "flutter" if (root / "pubspec.yaml").exists() else "rn"
+                if prep is not None:
+                    await prep   # the test run would start the service itself, but not twice at once
+                unmet, (tests_ok, test_log), _ = await all_of(
+                    stage("unmet_requirements", unmet_requirements, root),
+                    stage("run_local_tests", run_local_tests, root, framework, backend, impact=impact,
+                          cancellable=True, tags={"framework": framework, "backend": backend}),
+                    stage("index", symbols.refresh, default=None))
+                # If everything is green, we're done
+                if not unmet and tests_ok:
+                    console.print("[green]✅ Local tests passed and no unmet symbols – build is green!")
+                    return
+
+                # Build the message for Aider: unmet symbols, parsed failures (file/line/message/trimmed
+                # stack, deduplicated) and backend docs, packed under one token budget
+                failures, unparsed = extract_failures(test_log) if not tests_ok else ([], {})
+                # Add the 3 backend doc chunks most relevant to what is still broken, and pick
+                # only the files this pass is about (plus their imports) for Aider's chat
+                query = " ".join([*unmet, *(f"{f.test or ''} {f.message}" for f in failures), *unparsed.values()])
+                docs, files = await all_of(
+                    stage("doc_retrieval", _get_backend_docs, root, backend, query, default=[])
+                    if backend != "none" else asyncio.sleep(0, result=[]),
+                    stage("scope", symbols.scope, unmet, failures, default=[]))
+                msg_dict = pack_message(unmet, failures, unparsed, docs)
+
+                if speculate >= 2:
+                    green = await stage("speculate", race, root, framework, backend,
+                                        [model, PLANNING_MODEL if passes else DEBUG_MODEL], msg_dict, files,
+                                        speculate, passes + 1, tags={"candidates": speculate})
+                    if green:
+                        console.print("[green]✅ Merged candidate passed the tests with no unmet symbols – build is green!")
+                        return
+                    if green is False:
+                        passes += 1
+                        continue
+                if passes + 1 < 5:   # no warm-up for a pass that will never run
+                    prep = asyncio.ensure_future(stage("service_prep", prepare_backend, root, framework, backend,
+                                                       default=(None, "timed out")))
+                await stage("aider", aider.send, model, json.dumps(msg_dict), files, tag_result=True,
+                            tags={"mode": type(aider).__name__, "files": len(files)})
+            passes += 1
+    finally:
+        if prep is not None and not prep.done():
+            prep.cancel()
+        set_tags(pass_no=None, model=None)
 
     # If we exit the loop still failing, abort with non-zero exit code
     console.print("[red]❌  Maximum Aider passes reached but issues remain. Aborting.")
     raise SystemExit(1)
 
-def _get_backend_docs(root: Path, backend:str):
-    try:
-        import chromadb  # local import to avoid mandatory dependency if embeddings not used
-    except ImportError:
-        return []
-    store = root / "embeddings"
-    if not store.exists():
-        return []
-    try:
-        client = chromadb.PersistentClient(str(store))
-        col = client.get_collection("docs")
-        return col.peek()["documents"]
-    except Exception:
-        return []
+def _get_backend_docs(root: Path, backend: str, query: str = "", k: int = 3) -> list[str]:
+    """Top-k doc chunks for `query` (unmet symbols + failure text), best first."""
+    return retriever(root).query(query or backend, k)
@@ -0,0 +1,54 @@
+"""Per-run log files for streamed command output, cleaned up when the session ends."""
+
+from __future__ import annotations
+import atexit, itertools, os, re, shutil, tempfile, threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+FULL_LOG_PREFIX = "Full log: "   # first line of a captured command log that has a file behind it
+
+_lock = threading.Lock()
+_dir: Path | None = None
+_seq = itertools.count(1)
+
+def _cleanup():
+    global _dir
+    with _lock:
+        d, _dir = _dir, None
+    if d is not None and os.getenv("AGITEGEN_KEEP_LOGS") != "1":
+        shutil.rmtree(d, ignore_errors=True)
+
+def log_dir() -> Path:
+    """Temp dir for this session's logs; created on first use and removed at exit."""
+    global _dir
+    with _lock:
+        if _dir is None:
+            _dir = Path(tempfile.mkdtemp(prefix="agitegen-logs-"))
+            atexit.register(_cleanup)
+        return _dir
+
+def new_log(name: str) -> Path:
+    """A fresh, uniquely numbered log file path, e.g. `003-unit.log`."""
+    slug = re.sub(r"[^\w.-]+", "_", name).strip("_")[:60] or "cmd"
+    return log_dir() / f"{next(_seq):03d}-{slug}.log"
+
+@contextmanager
+def log_session():
+    """Scope temp logs to a block (e.g. one `build`); AGITEGEN_KEEP_LOGS=1 keeps them."""
+    try:
+        yield
+    finally:
+        _cleanup()
+
+def iter_full_log(log: str) -> Iterator[str]:
+    """Lines of the full log file behind a captured tail (see FULL_LOG_PREFIX), else of `log`."""
+    first, _, rest = log.partition("\n")
+    if first.startswith(FULL_LOG_PREFIX):
+        path = Path(first[len(FULL_LOG_PREFIX):])
+        if path.exists():
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    yield line.rstrip("\n")
+            return
+    yield from log.splitlines()
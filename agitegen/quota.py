@@ -1,78 +1,146 @@
-"""Guards: abort if OpenRouter credits <10 % or GH Actions minutes <100."""
+"""Guards: abort if OpenRouter credits <10 % or GH Actions minutes <100.
+
+Readings are cached for QUOTA_TTL seconds in `~/.agitegen/quota.json` so back-to-back
+commands don't re-hit the endpoints, both checks run concurrently in `preflight()`, and
+every call has a short explicit timeout.
+"""
 
 from __future__ import annotations
-import json, os, sys, httpx, subprocess
+import hashlib, json, os, sys, httpx, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from contextlib import contextmanager
+from .utils import cache_home
 
 console = Console()
 
-def ensure_openrouter_quota(threshold=0.10):
+USAGE_URL   = "https://openrouter.ai/api/v1/usage"
+QUOTA_TTL   = float(os.getenv("AGITEGEN_QUOTA_TTL", "60"))
+HTTP_TIMEOUT = httpx.Timeout(5, connect=3)
+GH_TIMEOUT  = 10
+_store_lock = threading.Lock()   # preflight's two checks write the same cache file
+
+def _cache_path():
+    return cache_home() / "quota.json"
+
+def _cached(name: str, max_age: float):
+    if max_age <= 0: return None
+    try:
+        entry = json.loads(_cache_path().read_text()).get(name)
+    except (OSError, ValueError):
+        return None
+    if entry and time.time() - entry["t"] <= max_age:
+        return entry["value"]
+    return None
+
+def _store(name: str, value):
+    path = _cache_path()
+    with _store_lock:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        data[name] = {"t": time.time(), "value": value}
+        tmp = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(data)); os.replace(tmp, path)
+
+def _openrouter_reading(max_age: float = 0) -> tuple[float, float]:
+    """(available, limit) from /usage – raises on HTTP/JSON errors."""
     key = os.getenv("OPENROUTER_API_KEY")
-    if not key: return
-    url = "https://openrouter.ai/api/v1/usage"
+    name = "openrouter:" + hashlib.sha1(key.encode()).hexdigest()[:12]   # never store the key itself
+    hit = _cached(name, max_age)
+    if hit is not None: return tuple(hit)
+    resp = httpx.get(USAGE_URL, headers={"Authorization": f"Bearer {key}", "Accept":"application/json"},
+                     timeout=HTTP_TIMEOUT)
+    resp.raise_for_status()
+    data = resp.json()
+    value = (data.get("available"), data.get("limit"))
+    _store(name, value)
+    return value
+
+def _github_minutes_used(max_age: float = 0) -> int:
+    hit = _cached("github", max_age)
+    if hit is not None: return hit
+    # Capture both stdout/stderr to avoid polluting logs if the command is unsupported
+    proc = subprocess.run([
+        "gh",
+        "api",
+        "/user/settings/billing/actions",
+        "--jq",
+        ".included_minutes_used",
+    ], text=True, capture_output=True, timeout=GH_TIMEOUT)
+
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or proc.stdout.strip())
+
+    used = int(proc.stdout.strip()) if proc.stdout.strip().isdigit() else 0
+    _store("github", used)
+    return used
+
+def ensure_openrouter_quota(threshold=0.10, max_age: float = QUOTA_TTL):
+    """Abort when credits are low; returns the (available, limit) reading it used, if any."""
+    key = os.getenv("OPENROUTER_API_KEY")
+    if not key: return None
     try:
-        resp = httpx.get(url, headers={"Authorization": f"Bearer {key}", "Accept":"application/json"})
-        resp.raise_for_status()
-        data = resp.json()
-        avail = data.get("available"); limit = data.get("limit")
+        avail, limit = _openrouter_reading(max_age)
         if limit and avail is not None and limit and avail / limit < threshold:
             console.print(f"[red]OpenRouter credits low ({avail}/{limit}) → aborting.")
             sys.exit(1)
+        return avail, limit
     except Exception as e:
         # If the usage endpoint fails or doesn't return JSON, skip the quota check instead of crashing.
         console.log(f"[yellow]Skipping OpenRouter quota check: {e}")
+        return None
 
-def ensure_github_minutes(threshold=100):
+def ensure_github_minutes(threshold=100, max_age: float = QUOTA_TTL):
     try:
-        # Capture both stdout/stderr to avoid polluting logs if the command is unsupported
-        proc = subprocess.run([
-            "gh",
-            "api",
-            "/user/settings/billing/actions",
-            "--jq",
-            ".included_minutes_used",
-        ], text=True, capture_output=True)
-
-        if proc.returncode != 0:
-            raise RuntimeError(proc.stderr.strip() or proc.stdout.strip())
-
-        used = int(proc.stdout.strip()) if proc.stdout.strip().isdigit() else 0
-        remain = 2000 - used
+        remain = 2000 - _github_minutes_used(max_age)
         if remain < threshold:
             console.print(f"[red]GitHub Actions minutes low ({remain}) → aborting.")
             sys.exit(1)
     except Exception as e:
         console.log(f"[yellow]Skipping GH minute check: {e}")
 
-def _get_openrouter_usage():
+def preflight():
+    """Run both quota checks concurrently; returns the OpenRouter (available, limit) reading.
+
+    Pass the result to `measure_session_cost(start=...)` to use it as the starting figure.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        openrouter = pool.submit(ensure_openrouter_quota)
+        github = pool.submit(ensure_github_minutes)
+        github.result()               # re-raises SystemExit from the worker thread
+        return openrouter.result()
+
+def _get_openrouter_usage(max_age: float = 0):
     key = os.getenv("OPENROUTER_API_KEY");
     if not key: return 0, 0
     try:
-        resp = httpx.get(
-            "https://openrouter.ai/api/v1/usage",
-            headers={"Authorization": f"Bearer {key}", "Accept": "application/json"}
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("available", 0), data.get("limit", 0)
+        avail, limit = _openrouter_reading(max_age)
+        return avail or 0, limit or 0
     except Exception as e:
         console.log(f"[yellow]Skipping OpenRouter usage retrieval: {e}")
         return 0, 0
 
 class _SessionCost:
+    def __init__(self, start=None, label="this build", max_age=QUOTA_TTL):
+        self.start, self.label, self.max_age = start, label, max_age
     def __enter__(self):
-        self.start_avail, self.start_limit = _get_openrouter_usage(); return self
+        # A reading from preflight() (or one cached within max_age) doubles as the start figure
+        avail, limit = self.start or _get_openrouter_usage(max_age=self.max_age)
+        self.start_avail, self.start_limit = avail or 0, limit or 0; return self
     def __exit__(self,*a):
         end_avail, _ = _get_openrouter_usage()
         spent = self.start_avail - end_avail
         if spent:
-            console.print(f"[cyan]💸 OpenRouter tokens spent this build: {spent}")
+            console.print(f"[cyan]💸 OpenRouter tokens spent {self.label}: {spent}")
 
 # helper to wrap build cost reporting
 @contextmanager
-def measure_session_cost():
-    token_ctx = _SessionCost()
+def measure_session_cost(start=None, label="this build", max_age=QUOTA_TTL):
+    """Print the OpenRouter credit spent inside the block. The figure is account-wide, so
+    anything else spending at the same time is included – `label` says what it covers."""
+    token_ctx = _SessionCost(start, label, max_age)
     token_ctx.__enter__()
     try:
         yield
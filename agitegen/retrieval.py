@@ -0,0 +1,104 @@
+"""Relevance-ranked backend-doc retrieval for repair prompts.
+
+Queries the Chroma `docs` collection written by `embed.embed_backend` when chromadb is
+installed; otherwise (or if the store can't be opened) ranks the chunks recorded in
+`embeddings/manifest.json` with an in-process BM25 inverted index. One retriever per
+project is kept for the whole session.
+"""
+
+from __future__ import annotations
+import functools, json, math, re
+from collections import Counter, defaultdict
+from pathlib import Path
+from .embed import MANIFEST
+from .utils import console
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_WORD  = re.compile(r"[A-Za-z0-9]+")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens; a camelCase identifier gives its parts plus the whole word."""
+    tokens = []
+    for word in _WORD.findall(text):
+        parts = _CAMEL.sub(" ", word).lower().split()
+        tokens += parts
+        if len(parts) > 1:
+            tokens.append(word.lower())
+    return tokens
+
+class BM25:
+    """Okapi BM25 over a fixed list of documents, via an inverted index."""
+
+    def __init__(self, docs: list[str], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1, self.b = k1, b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self.lengths = []
+        for i, doc in enumerate(docs):
+            tf = Counter(tokenize(doc))
+            self.lengths.append(sum(tf.values()))
+            for term, n in tf.items():
+                self.postings[term].append((i, n))
+        self.avg = (sum(self.lengths) / len(docs)) if docs else 0.0
+
+    def top(self, query: str, k: int) -> list[str]:
+        scores: dict[int, float] = defaultdict(float)
+        n = len(self.docs)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for i, tf in posting:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / norm
+        ranked = sorted(scores, key=lambda i: scores[i], reverse=True)[:k]
+        return [self.docs[i] for i in ranked]
+
+class DocRetriever:
+    def __init__(self, root: Path):
+        self.store = root / "embeddings"
+        self._col = None
+        self._chroma_failed = False
+        self._bm25: tuple[float, BM25] | None = None   # (manifest mtime, index)
+
+    def _collection(self):
+        if self._col is None and not self._chroma_failed:
+            try:
+                import chromadb  # local import to avoid mandatory dependency if embeddings not used
+                self._col = chromadb.PersistentClient(str(self.store)).get_collection("docs")
+            except ImportError:
+                self._chroma_failed = True
+            except Exception as e:
+                console.log(f"[yellow]Chroma store unavailable, using lexical doc search: {e}")
+                self._chroma_failed = True
+        return self._col
+
+    def _lexical(self) -> BM25 | None:
+        path = self.store / MANIFEST
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+        if self._bm25 is None or self._bm25[0] != mtime:   # add-backend may extend it mid-session
+            manifest = json.loads(path.read_text())
+            chunks = [c for entry in manifest.values() for c in entry.get("chunks", {}).values()]
+            self._bm25 = (mtime, BM25(chunks))
+        return self._bm25[1]
+
+    def query(self, text: str, k: int = 3) -> list[str]:
+        if not self.store.exists():
+            return []
+        col = self._collection()
+        if col is not None:
+            try:
+                n = min(k, col.count())
+                return col.query(query_texts=[text], n_results=n)["documents"][0] if n else []
+            except Exception as e:
+                console.log(f"[yellow]Chroma query failed, using lexical doc search: {e}")
+        index = self._lexical()
+        return index.top(text, k) if index else []
+
+@functools.lru_cache(maxsize=None)
+def retriever(root: Path) -> DocRetriever:
+    return DocRetriever(root)
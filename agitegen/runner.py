@@ -1,13 +1,154 @@
-import subprocess, platform, shutil, os
+"""`agitegen run`: dev servers and app runners under one supervisor.
 
-def _spawn(cmd): subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+Every child runs in its own process group with its output drained by a reader thread –
+into `.agitegen/run/<name>.log` and the console, prefixed with the process name – so a
+chatty dev server can never block on a full pipe. A readiness pattern per process reports
+when it is serving. Crashed processes (non-zero exit) restart with exponential backoff,
+up to MAX_RESTARTS in a row. When a process exits, whatever it left running in its group
+(watchers, a server it spawned) is stopped with it; Ctrl-C, SIGTERM or the CLI exiting stops
+every process group started.
+"""
 
-def run_local():
-    if shutil.which("npm"): _spawn(["npm","run","dev"])
-    if shutil.which("expo"): _spawn(["npx","expo","run:android"])
+from __future__ import annotations
+import atexit, platform, re, shutil, signal, subprocess, threading, time
+from dataclasses import dataclass, field
+from pathlib import Path
+from rich.markup import escape
+from .utils import console, state_dir, terminate_group
+
+RUN_LOG_DIR  = "run"
+MAX_RESTARTS = 5       # consecutive crashes before a process is given up on
+BACKOFF      = (1.0, 30.0)   # first / longest delay between restarts, doubling in between
+STABLE_AFTER = 60.0    # seconds up after which a crash counts as the first again
+_COLORS = ("cyan", "magenta", "green", "yellow", "blue", "bright_red")
+
+@dataclass
+class Process:
+    name: str
+    cmd: list[str]
+    ready: re.Pattern | None = None
+    color: str = "cyan"
+    proc: subprocess.Popen | None = None
+    crashes: int = 0
+    started: float = 0.0
+    is_ready: bool = False
+    done: bool = False
+    log: Path | None = None
+    reader: threading.Thread | None = field(default=None, repr=False)
+
+class Supervisor:
+    def __init__(self, root: Path):
+        self.root = root
+        self.procs: list[Process] = []
+        self.stopping = threading.Event()
+        self.groups: dict[int, subprocess.Popen] = {}   # pgid -> leader, for every group still to be stopped
+        self.log_dir = state_dir(root) / RUN_LOG_DIR
+        self.log_dir.mkdir(exist_ok=True)
+
+    def add(self, name: str, cmd: list[str], ready: str | None = None):
+        self.procs.append(Process(name, cmd, re.compile(ready, re.I) if ready else None,
+                                  _COLORS[len(self.procs) % len(_COLORS)], log=self.log_dir / f"{name}.log"))
+
+    def _start(self, p: Process):
+        p.is_ready, p.started = False, time.monotonic()
+        log = open(p.log, "a", encoding="utf-8", errors="replace")
+        log.write(f"\n--- {time.strftime('%H:%M:%S')} $ {' '.join(p.cmd)}\n")
+        try:
+            p.proc = subprocess.Popen(p.cmd, cwd=self.root, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True, errors="replace", bufsize=1,
+                                      start_new_session=True)
+        except OSError as e:
+            log.close()
+            console.print(f"[red]{p.name}: {e}")
+            p.done = True
+            return
+        self.groups[p.proc.pid] = p.proc   # start_new_session: the pid is the group id
+        p.reader = threading.Thread(target=self._drain, args=(p, log), daemon=True)
+        p.reader.start()
+
+    def _drain(self, p: Process, log):
+        prefix = f"[{p.color}]{p.name:>10} │[/{p.color}] "
+        with log:
+            for line in p.proc.stdout:
+                log.write(line)
+                log.flush()
+                line = line.rstrip("\n")
+                console.print(prefix + escape(line), highlight=False)
+                if p.ready is not None and not p.is_ready and p.ready.search(line):
+                    p.is_ready = True
+                    console.print(f"[green]{p.name} ready[/green] ({time.monotonic() - p.started:.1f}s)")
+            p.proc.stdout.close()
+
+    def run(self):
+        """Start everything and supervise until every process finished or we are told to stop."""
+        previous = signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+        atexit.register(self.stop)
+        try:
+            for p in self.procs:
+                self._start(p)
+            console.print(f"[grey]Logs: {self.log_dir}  –  Ctrl-C stops everything")
+            restart_at: dict[str, float] = {}
+            while not self.stopping.is_set() and not all(p.done for p in self.procs):
+                for p in self.procs:
+                    if p.done:
+                        continue
+                    if p.name in restart_at:
+                        if time.monotonic() >= restart_at[p.name]:
+                            del restart_at[p.name]
+                            self._start(p)
+                        continue
+                    code = p.proc.poll()
+                    if code is None:
+                        continue
+                    # a surviving child (node under `npm run dev`) would keep the port and the pipe
+                    terminate_group(self.groups.pop(p.proc.pid, p.proc), grace=5)
+                    p.reader.join(timeout=5)
+                    if code == 0:
+                        console.print(f"[grey]{p.name} exited")
+                        p.done = True
+                        continue
+                    p.crashes = 1 if time.monotonic() - p.started > STABLE_AFTER else p.crashes + 1
+                    if p.crashes > MAX_RESTARTS:
+                        console.print(f"[red]{p.name} keeps crashing (exit {code}) – giving up; see {p.log}")
+                        p.done = True
+                        continue
+                    delay = min(BACKOFF[0] * 2 ** (p.crashes - 1), BACKOFF[1])
+                    console.print(f"[yellow]{p.name} crashed (exit {code}) – restarting in {delay:.0f}s")
+                    restart_at[p.name] = time.monotonic() + delay
+                self.stopping.wait(0.2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            signal.signal(signal.SIGTERM, previous)
+
+    def stop(self):
+        """Terminate every process group started, including those whose leader already
+        exited (idempotent)."""
+        self.stopping.set()
+        running = [p for p in self.procs if p.proc is not None and p.proc.poll() is None]
+        if running:
+            console.print(f"[blue]Stopping {', '.join(p.name for p in running)}...")
+        groups, self.groups = list(self.groups.values()), {}
+        threads = [threading.Thread(target=terminate_group, args=(proc,)) for proc in groups]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+def run_local(root: Path | None = None):
+    sup = Supervisor(root or Path.cwd())
+    if shutil.which("npm"):
+        sup.add("dev", ["npm","run","dev"], ready=r"ready|Local:\s+http|compiled successfully|localhost:\d+")
+    if shutil.which("expo"):
+        sup.add("android", ["npx","expo","run:android"], ready=r"Waiting on http|Logs for your project")
     if platform.system()=="Darwin" and shutil.which("expo"):
-        _spawn(["npx","expo","run:ios"])
+        sup.add("ios", ["npx","expo","run:ios"], ready=r"Waiting on http|Logs for your project")
     if shutil.which("flutter"):
-        _spawn(["flutter","run","-d","chrome"])
+        sup.add("web", ["flutter","run","-d","chrome"], ready=r"is being served at|Flutter run key commands")
     if platform.system()=="Darwin" and shutil.which("flutter"):
-        _spawn(["flutter","run","-d","ios"])
+        sup.add("flutter-ios", ["flutter","run","-d","ios"], ready=r"Flutter run key commands")
+    if not sup.procs:
+        console.print("[yellow]Nothing to run: npm, expo and flutter were not found on PATH.")
+        return
+    sup.run()
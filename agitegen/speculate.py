@@ -0,0 +1,179 @@
+"""Speculative repair: race several Aider candidates in git worktrees, keep the first green.
+
+With `agitegen build --speculate N`, a failing pass doesn't send one repair to one model.
+It starts N candidates at once, alternating the planning and debug models (candidates
+beyond the second also get a different approach hint). Each candidate runs in its own
+detached `git worktree` of the current tree, kept outside the project (under
+`~/.agitegen/speculate/`) so the project's own jest/eslint runs never see it. There, with
+its own Aider driver, it makes its repair and then runs the full local test suite and the
+requirement scan, against its own backend service slot.
+
+The first candidate to come back green is merged into the project and the others are
+cancelled. Their running test commands are killed, but an Aider call already in flight
+finishes. If none is green, the one with the fewest unmet symbols and failed steps is kept,
+and the loop carries on from there, exactly as after a normal pass.
+
+Worktrees share the project's node_modules through a symlink, so they don't install again.
+"""
+
+from __future__ import annotations
+import hashlib, json, os, shutil, subprocess, threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from .aider_session import aider_driver
+from .deps import STAMP
+from .impact import snapshot
+from .services import release, service_slot
+from .tester import run_local_tests
+from .trace import span
+from .unmet import unmet_requirements
+from .utils import cache_home, console, state_dir
+
+MAX_CANDIDATES = 4
+SLOT_BASE = 50   # candidate service slots start here, clear of build-many's 1..jobs
+HINTS = ("", "",
+         "Fix the root cause with the smallest change that makes the failing tests pass.",
+         "If a module is beyond repair, rewrite it from scratch against the failing tests.")
+# never part of a candidate's result: shared dependencies and Aider's chat history
+_EXCLUDE = (":(exclude)node_modules", ":(exclude).aider*")
+
+@dataclass
+class Candidate:
+    index: int
+    model: str
+    path: Path
+    slot: int
+    cancel: threading.Event = field(default_factory=threading.Event)
+    tests_ok: bool = False
+    unmet: list[str] = field(default_factory=list)
+    failed_steps: int = 0
+    usage: dict = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def green(self) -> bool:
+        return self.error is None and self.tests_ok and not self.unmet
+
+    def score(self) -> tuple:
+        return (self.error is not None, len(self.unmet) + self.failed_steps, self.index)
+
+def _git(root: Path, *args: str, **kw) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=root, capture_output=True, text=True, **kw)
+
+def _base(root: Path) -> tuple[str, str, bool] | None:
+    """(commit, tree, clean): a commit holding the current working tree, for the worktrees."""
+    tree = snapshot(root)
+    head = _git(root, "rev-parse", "HEAD").stdout.strip()
+    if tree is None or not head:
+        return None
+    if _git(root, "rev-parse", "HEAD^{tree}").stdout.strip() == tree:
+        return head, tree, True
+    commit = _git(root, "commit-tree", tree, "-p", head, "-m", "agitegen: speculation base").stdout.strip()
+    return (commit, tree, False) if commit else None
+
+def _add_worktree(root: Path, base: str, path: Path):
+    shutil.rmtree(path, ignore_errors=True)
+    _git(root, "worktree", "prune")
+    _git(root, "worktree", "add", "--detach", "--force", str(path), base, check=True)
+    if (root / "node_modules").is_dir():
+        os.symlink(root / "node_modules", path / "node_modules")
+        stamp = state_dir(root) / STAMP
+        if stamp.exists():   # same lockfile, so the shared tree counts as installed
+            shutil.copyfile(stamp, state_dir(path) / STAMP)
+    for name in (".aider.chat.history.md", ".aider.input.history"):   # for --continue / restored chat
+        if (root / name).exists():
+            shutil.copyfile(root / name, path / name)
+
+def _remove_worktree(root: Path, path: Path, backend: str):
+    release(path, backend)
+    _git(root, "worktree", "remove", "--force", str(path))
+    shutil.rmtree(path, ignore_errors=True)
+    _git(root, "worktree", "prune")
+
+def _attempt(c: Candidate, framework: str, backend: str, msg: dict, files: list[str]):
+    with span("speculate:candidate", candidate=c.index, model=c.model) as tags:
+        try:
+            hint = HINTS[c.index % len(HINTS)]
+            c.usage = aider_driver(c.path).send(c.model, json.dumps({**msg, "approach": hint} if hint else msg), files)
+            tags.update(c.usage)
+            if c.cancel.is_set():
+                return
+            c.tests_ok, log = run_local_tests(c.path, framework, backend, cancel=c.cancel, slot=c.slot)
+            c.failed_steps = log.count("=== [failed]")
+            c.unmet = [] if c.cancel.is_set() else list(unmet_requirements(c.path))
+        except BaseException as e:   # SystemExit from a failed aider/npm run included
+            c.error = str(e) or type(e).__name__
+        tags["green"] = c.green
+
+def _merge(root: Path, c: Candidate, base: str, base_tree: str, clean: bool) -> bool:
+    """Bring the candidate's commits and remaining changes into the project; True if the
+    project's tree then matches the candidate's exactly."""
+    head = _git(c.path, "rev-parse", "HEAD").stdout.strip()
+    tree = snapshot(c.path)
+    if tree is None:
+        return False
+    start = base_tree
+    if clean and head and head != base and _git(root, "merge", "--ff-only", "-q", head).returncode == 0:
+        start = _git(root, "rev-parse", "HEAD^{tree}").stdout.strip()   # keeps Aider's commit messages
+    diff = _git(root, "diff", "--binary", start, tree, "--", ".", *_EXCLUDE).stdout
+    if diff:
+        applied = subprocess.run(["git", "apply", "--whitespace=nowarn", "-"], cwd=root, input=diff,
+                                 capture_output=True, text=True)
+        if applied.returncode != 0:
+            console.print(f"[red]Could not apply candidate {c.index}'s changes: {applied.stderr.strip()}")
+            return False
+    now = snapshot(root)
+    return now is not None and _git(root, "diff", "--quiet", now, tree, "--", ".", *_EXCLUDE).returncode == 0
+
+def _locked(lock: threading.Lock, fn, *args):
+    with lock:
+        fn(*args)
+
+def race(root: Path, framework: str, backend: str, models: list[str], msg: dict, files: list[str],
+         n: int, pass_no: int) -> bool | None:
+    """Run `n` repair candidates for this pass. True: a green candidate was merged (the build
+    is green); False: the best non-green one was merged; None: speculation was impossible."""
+    base = _base(root)
+    if base is None:
+        console.print("[yellow]Speculation needs a git repository with a commit – running one candidate")
+        return None
+    base_commit, base_tree, clean = base
+    n = min(n, MAX_CANDIDATES)
+    first_slot = SLOT_BASE + service_slot() * MAX_CANDIDATES
+    spec_dir = cache_home("speculate", f"{root.name}-{hashlib.sha1(str(root).encode()).hexdigest()[:8]}")
+    candidates = [Candidate(i, models[i % len(models)], spec_dir / f"pass{pass_no}-{i}", first_slot + i)
+                  for i in range(n)]
+    for c in candidates:
+        _add_worktree(root, base_commit, c.path)
+    console.print(f"[blue]Speculating: {n} repair candidates ({', '.join(c.model for c in candidates)})")
+    pool = ThreadPoolExecutor(max_workers=n)
+    futures = {pool.submit(_attempt, c, framework, backend, msg, files): c for c in candidates}
+    winner = chosen = None
+    pending = set(futures)
+    git_lock = threading.Lock()   # loser cleanup (worktree remove/prune) never overlaps the merge
+    try:
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((futures[f] for f in done if futures[f].green), None)
+        chosen = winner or min(candidates, key=Candidate.score)
+    finally:
+        for c in candidates:
+            c.cancel.set()
+        for f, c in futures.items():   # a loser still inside Aider cleans up once it returns
+            if c is not chosen:
+                f.add_done_callback(lambda _, c=c: _locked(git_lock, _remove_worktree, root, c.path, backend))
+        pool.shutdown(wait=False)
+    if chosen.error is not None:
+        _locked(git_lock, _remove_worktree, root, chosen.path, backend)
+        for c in candidates:
+            console.print(f"[red]Candidate {c.index} ({c.model}) failed: {c.error}")
+        raise SystemExit(1)
+    with git_lock, span("speculate:merge", candidate=chosen.index, green=chosen.green):
+        merged = _merge(root, chosen, base_commit, base_tree, clean)
+        _remove_worktree(root, chosen.path, backend)
+    if winner is not None:
+        console.print(f"[green]Candidate {winner.index} ({winner.model}) is green – merged, others cancelled.")
+        return merged   # if the merge wasn't exact, the next pass re-tests the project itself
+    console.print(f"[yellow]No candidate went green; keeping candidate {chosen.index} ({chosen.model}).")
+    return False
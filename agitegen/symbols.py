@@ -0,0 +1,153 @@
+"""Incremental definition/import index of the project's TS/JS/Dart sources.
+
+Lets the repair loop hand Aider only the files a pass is about – where failures point,
+the modules whose names or definitions match unmet symbols, and their direct imports –
+instead of the whole tree. Per-file entries (definitions and raw import specifiers) are
+cached in `.agitegen/symbol-index.json` by mtime/size; imports are resolved at query time
+against the current file set, so a newly created module satisfies earlier imports.
+"""
+
+from __future__ import annotations
+import json, os, re
+from pathlib import Path
+from typing import Iterable
+from .retrieval import tokenize
+from .utils import list_files, read_text, state_dir
+
+INDEX_FILE  = "symbol-index.json"
+INDEX_VERSION = 1
+MAX_FILES   = 12     # files put in Aider's chat per pass, seeds first
+NAME_MATCHES = 3     # best name/definition matches per unmet symbol
+SOURCE_EXTS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".dart")
+_JS_EXTS    = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+_SKIP_DIRS  = {"node_modules", "build", "dist", "ios", "android", ".dart_tool", "embeddings"}
+
+_JS_DEF = re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?"
+                     r"(?:function\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)", re.M)
+_JS_IMPORT = re.compile(r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"]+)['"]""")
+# top-level declarations only (column 0); `[ ]` rather than `\s` so a match never spans lines
+_DART_DEF = re.compile(r"^(?:abstract |sealed |base |final )*(?:class|enum|mixin|extension|typedef) +(\w+)"
+                       r"|^(?:final|const|var|late) +(?:[\w<>?, ]+ )?(\w+) *="
+                       r"|^[A-Za-z_][\w<>?, ]* +(\w+) *\(", re.M)
+_NOT_DEFS = {"main", "if", "for", "while", "switch", "return", "await"}
+_FRAME_PATH = re.compile(r"((?:/|\.{1,2}/)?[\w@.\-/]+\.(?:[cm]?[jt]sx?|dart))")
+_DART_IMPORT = re.compile(r"""^\s*(?:import|export|part)\s+['"]([^'"]+)['"]""", re.M)
+
+def _parse(rel: str, text: str) -> tuple[list[str], list[str]]:
+    """(definitions, raw import specifiers) of one source file."""
+    if rel.endswith(".dart"):
+        defs = [next(g for g in m.groups() if g) for m in _DART_DEF.finditer(text)]
+        return sorted(set(defs) - _NOT_DEFS), _DART_IMPORT.findall(text)
+    return sorted(set(_JS_DEF.findall(text))), _JS_IMPORT.findall(text)
+
+def _relpath(path: str, root: Path) -> str | None:
+    """`path` (absolute, ./-relative or root-relative, as in stack frames) relative to root."""
+    p = Path(path)
+    if p.is_absolute():
+        try:
+            p = p.resolve().relative_to(root.resolve())
+        except ValueError:
+            return None
+    return os.path.normpath(p).replace(os.sep, "/")
+
+class SymbolIndex:
+    def __init__(self, root: Path):
+        self.root = root
+        self.path = state_dir(root) / INDEX_FILE
+        self.files: dict[str, list] = {}    # rel -> [mtime_ns, size, defs, imports]
+        self.package = self._dart_package()
+
+    def _dart_package(self) -> str | None:
+        try:
+            m = re.search(r"^name:\s*(\S+)", (self.root / "pubspec.yaml").read_text(), re.M)
+            return m.group(1) if m else None
+        except OSError:
+            return None
+
+    def refresh(self) -> "SymbolIndex":
+        """Re-parse only files whose mtime/size changed since the cached index."""
+        try:
+            cached = json.loads(self.path.read_text())
+            cached = cached["files"] if cached.get("version") == INDEX_VERSION else {}
+        except (OSError, ValueError, AttributeError):
+            cached = {}
+        files = {}
+        for path in list_files(self.root):
+            if path.suffix not in SOURCE_EXTS:
+                continue
+            rel = path.relative_to(self.root).as_posix()
+            if _SKIP_DIRS.intersection(rel.split("/")[:-1]):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entry = cached.get(rel)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                files[rel] = entry
+                continue
+            text = read_text(path)
+            files[rel] = [st.st_mtime_ns, st.st_size, *(_parse(rel, text) if text else ([], []))]
+        self.files = files
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": INDEX_VERSION, "files": files}))
+        os.replace(tmp, self.path)
+        return self
+
+    # -- queries ----------------------------------------------------------------
+    def imports(self, rel: str) -> list[str]:
+        """Project files `rel` imports directly (packages and unresolved specifiers dropped)."""
+        out = []
+        for spec in self.files.get(rel, [0, 0, [], []])[3]:
+            target = self._resolve(rel, spec)
+            if target and target != rel:
+                out.append(target)
+        return out
+
+    def _resolve(self, rel: str, spec: str) -> str | None:
+        if rel.endswith(".dart"):
+            if spec.startswith("dart:"):
+                return None
+            if spec.startswith("package:"):
+                pkg, _, sub = spec[len("package:"):].partition("/")
+                return f"lib/{sub}" if pkg == self.package and f"lib/{sub}" in self.files else None
+            base = os.path.normpath(os.path.join(os.path.dirname(rel), spec)).replace(os.sep, "/")
+            return base if base in self.files else None
+        if spec.startswith("."):
+            base = os.path.normpath(os.path.join(os.path.dirname(rel), spec)).replace(os.sep, "/")
+        elif spec.startswith(("@/", "~/")):    # the usual tsconfig alias for the source root
+            base = "src/" + spec[2:]
+        else:
+            return None
+        for cand in (base, *(base + e for e in _JS_EXTS), *(f"{base}/index{e}" for e in _JS_EXTS)):
+            if cand in self.files:
+                return cand
+        return None
+
+    def by_name(self, symbol: str, k: int = NAME_MATCHES) -> list[str]:
+        """Files whose path or definitions share the most words with `symbol` (camelCase-aware)."""
+        words = set(tokenize(symbol)) - {"use", "get", "set", "is", "the", "a"}
+        scored = []
+        for rel, entry in self.files.items():
+            overlap = len(words & set(tokenize(rel.rsplit(".", 1)[0]))) * 2 + \
+                      len(words & {w for d in entry[2] for w in tokenize(d)})
+            if overlap:
+                scored.append((-overlap, len(rel), rel))
+        return [rel for _, _, rel in sorted(scored)[:k]]
+
+    def scope(self, unmet: Iterable[str], failures: Iterable, max_files: int = MAX_FILES) -> list[str]:
+        """Smallest file set for a pass: failure sites and stack frames, the best matches for
+        each unmet symbol, then the direct imports of those seeds – capped at `max_files`."""
+        seeds: list[str] = []
+        for f in failures:
+            paths = [f.file] if f.file else []
+            paths += [m.group(1) for frame in f.stack for m in [_FRAME_PATH.search(frame)] if m]
+            for p in paths:
+                rel = _relpath(p, self.root)
+                if rel in self.files:
+                    seeds.append(rel)
+        for sym in unmet:
+            seeds += self.by_name(sym)   # unmet: by definition no file contains it yet
+        seeds = list(dict.fromkeys(seeds))
+        related = [dep for rel in seeds for dep in self.imports(rel)]
+        return list(dict.fromkeys(seeds + related))[:max_files]
@@ -0,0 +1,195 @@
+"""Cache of pristine scaffold outputs (`create-expo-app`, `flutter create`, `create-next-app`).
+
+Entries live in `~/.agitegen/templates/<key>/` and are keyed by the framework's command line
+and the scaffolding tool's version. A new project is materialized by copying the entry
+(node_modules is hard-linked, not copied) and renaming the placeholder project name, so
+`init` no longer waits on npm resolution and works offline once the cache is warm. When the
+tool version can't be determined (offline), the newest entry for the same command is used.
+
+AGITEGEN_TEMPLATE_CACHE=0 runs the scaffolding tool directly, as before.
+"""
+
+from __future__ import annotations
+import hashlib, json, os, re, shutil, subprocess, tempfile, time
+from pathlib import Path
+from typing import Callable
+from .deps import mark_linked
+from .utils import cache_home, console, copy_tree, run_cmd
+
+PLACEHOLDER = "agitegen_tpl"     # project name the cached copy is created with
+MAX_RENAME_BYTES = 1 << 20       # larger files are never project-name carriers
+META = "meta.json"
+
+CommandFor = Callable[[str], "list[str] | None"]   # project name -> scaffolding command
+
+def enabled() -> bool:
+    return os.getenv("AGITEGEN_TEMPLATE_CACHE", "1") != "0"
+
+def _root() -> Path:
+    return cache_home("templates")
+
+# -- keys ----------------------------------------------------------------------------
+def tool_version(cmd: list[str]) -> str | None:
+    """Version the scaffolding command would run, or None when it can't be told (offline)."""
+    try:
+        if cmd[0] == "flutter":
+            out = subprocess.run(["flutter", "--version", "--machine"], capture_output=True, text=True, timeout=60)
+            return json.loads(out.stdout).get("frameworkVersion")
+        if cmd[0] == "npx":
+            pkg = next(a for a in cmd[1:] if not a.startswith("-"))
+            pkg = pkg.rsplit("@", 1)[0] if pkg.rfind("@") > 0 else pkg
+            out = subprocess.run(["npm", "view", pkg, "version"], capture_output=True, text=True, timeout=15)
+            return out.stdout.strip() or None if out.returncode == 0 else None
+    except (OSError, ValueError, StopIteration, subprocess.TimeoutExpired):
+        return None
+    return None
+
+def _family(cmd: list[str]) -> str:
+    return hashlib.sha1(json.dumps(cmd).encode()).hexdigest()[:12]
+
+def _key(cmd: list[str], version: str) -> str:
+    return f"{_family(cmd)}-{hashlib.sha1(version.encode()).hexdigest()[:8]}"
+
+def entries() -> list[dict]:
+    """Metadata of every complete cache entry, newest first."""
+    out = []
+    for meta in _root().glob(f"*/{META}"):
+        try:
+            out.append({**json.loads(meta.read_text()), "path": str(meta.parent)})
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda e: e["created"], reverse=True)
+
+def _lookup(cmd: list[str], version: str | None) -> Path | None:
+    if version is not None:
+        path = _root() / _key(cmd, version)
+        return path if (path / META).exists() else None
+    family = [e for e in entries() if e["family"] == _family(cmd)]
+    return Path(family[0]["path"]) if family else None
+
+# -- create / materialize ----------------------------------------------------------------
+def warm(framework: str, command_for: CommandFor, version: str | None = None,
+         resolved: bool = False) -> Path | None:
+    """Make sure the cache holds the current template for `framework`; returns its entry.
+
+    `resolved` means `version` was already looked up (None: it couldn't be told), so the
+    possibly slow `tool_version` isn't run a second time.
+    """
+    cmd = command_for(PLACEHOLDER)
+    if cmd is None:
+        return None
+    if version is None and not resolved:
+        version = tool_version(cmd)
+    if version is None:
+        console.print(f"[yellow]Can't tell the {cmd[0]} scaffolder's version (offline?) – not caching {framework}.")
+        return _lookup(cmd, None)
+    entry = _lookup(cmd, version)
+    if entry is not None:
+        return entry
+    console.print(f"[blue]Caching the {framework} template ({' '.join(cmd[:3])} {version})...")
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=_root()))
+    try:
+        run_cmd(cmd, cwd=tmp)
+        app = tmp / PLACEHOLDER
+        if not app.is_dir():
+            console.print(f"[red]{cmd[0]} did not create {PLACEHOLDER}/ – template not cached.")
+            return None
+        git = (app / ".git").exists()
+        shutil.rmtree(app / ".git", ignore_errors=True)   # history is recreated per project
+        app.rename(tmp / "app")
+        (tmp / META).write_text(json.dumps({
+            "framework": framework, "command": cmd, "family": _family(cmd), "version": version,
+            "git": git, "created": time.time(),
+        }))
+        final = _root() / _key(cmd, version)
+        try:
+            tmp.rename(final)
+        except OSError:   # another init cached it first
+            return final
+        return final
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def materialize(root: Path, framework: str, command_for: CommandFor) -> str:
+    """Create the project at `root` from the cache (filling it first on a miss).
+
+    Returns "hit", "miss" or "direct" (cache disabled or unusable – the tool ran in place).
+    """
+    cmd = command_for(PLACEHOLDER)
+    if cmd is None:
+        return "direct"
+    version = tool_version(cmd) if enabled() else None
+    entry = _lookup(cmd, version) if enabled() else None
+    outcome = "hit"
+    if entry is None and enabled():
+        entry, outcome = warm(framework, command_for, version, resolved=True), "miss"
+    if entry is None:
+        run_cmd(command_for(root.name), cwd=root.parent)
+        return "direct"
+    meta = json.loads((entry / META).read_text())
+    copy_tree(entry / "app", root)
+    _rename(root, root.name)
+    mark_linked(root)   # node_modules shares inodes with the cache: npm must replace, not edit it
+    if meta.get("git"):
+        _git_init(root)
+    return outcome
+
+def _forms(name: str) -> dict[str, str]:
+    words = re.findall(r"[A-Za-z0-9]+", name) or [name]
+    lower = [w.lower() for w in words]
+    return {
+        "snake": name,   # scaffolders take the directory name verbatim
+        "kebab": "-".join(lower),
+        "camel": lower[0] + "".join(w.capitalize() for w in lower[1:]),
+        "pascal": "".join(w.capitalize() for w in lower),
+        "title": " ".join(w.capitalize() for w in lower),
+    }
+
+def _rename(root: Path, name: str):
+    """Replace every spelling of PLACEHOLDER (file contents and paths) with the project's name."""
+    old, new = _forms(PLACEHOLDER), _forms(name)
+    pairs = sorted(((old[k], new[k]) for k in old if old[k] != new[k]), key=lambda p: len(p[0]), reverse=True)
+    if not pairs:
+        return
+    rx = re.compile("|".join(re.escape(o) for o, _ in pairs))
+    repl = dict(pairs)
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        if "node_modules" in Path(dirpath).relative_to(root).parts:
+            continue
+        for fname in filenames:
+            path = Path(dirpath) / fname
+            if path.is_symlink() or path.stat().st_size > MAX_RENAME_BYTES:
+                continue
+            data = path.read_bytes()
+            if b"\0" in data[:8192]:
+                continue
+            text = data.decode("utf-8", errors="surrogateescape")
+            if rx.search(text):
+                path.write_bytes(rx.sub(lambda m: repl[m.group(0)], text).encode("utf-8", errors="surrogateescape"))
+        for entry in filenames + dirnames:
+            if rx.search(entry):
+                os.rename(Path(dirpath) / entry, Path(dirpath) / rx.sub(lambda m: repl[m.group(0)], entry))
+
+def _git_init(root: Path):
+    git = lambda *a: subprocess.run(["git", *a], cwd=root, capture_output=True)
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-qm", "Initial commit")   # without a git identity this fails quietly, like the scaffolders
+
+# -- maintenance -------------------------------------------------------------------------
+def prune(keep: int = 1, older_than_days: float | None = None) -> list[Path]:
+    """Keep the `keep` newest entries per command (and none older than the age limit);
+    also clears half-written leftovers. Returns what was removed."""
+    removed, seen = [], {}
+    now = time.time()
+    for e in entries():
+        seen[e["family"]] = seen.get(e["family"], 0) + 1
+        too_old = older_than_days is not None and now - e["created"] > older_than_days * 86400
+        if seen[e["family"]] > keep or too_old:
+            removed.append(Path(e["path"]))
+    for path in _root().iterdir():
+        if path.is_dir() and not (path / META).exists() and now - path.stat().st_mtime > 3600:
+            removed.append(path)
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
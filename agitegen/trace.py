@@ -0,0 +1,96 @@
+"""Span-based phase timing, written as a Chrome trace (chrome://tracing / Perfetto).
+
+    with span("run_local_tests", framework="rn") as tags:
+        ...
+        tags["tokens_sent"] = 1234     # anything added to `tags` lands in the event's args
+
+`set_tags(pass_no=2, model=...)` adds tags to every span that follows (threads included);
+`trace_session(path)` collects one command's spans and writes them out when it ends.
+"""
+
+from __future__ import annotations
+import json, os, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+from rich.table import Table
+from .utils import console
+
+TRACE_FILE = "trace.json"
+_lock = threading.Lock()
+_events: list[dict] = []
+_tags: dict[str, object] = {}
+_t0 = time.perf_counter()
+
+def set_tags(**tags):
+    """Tags merged into every later span; a value of None removes the tag."""
+    with _lock:
+        for k, v in tags.items():
+            if v is None: _tags.pop(k, None)
+            else: _tags[k] = v
+
+@contextmanager
+def span(name: str, **tags):
+    with _lock:
+        args = {**_tags, **tags}
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter()
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": round((start - _t0) * 1e6), "dur": round((end - start) * 1e6), "args": args}
+        with _lock:
+            _events.append(event)
+
+def write_trace(path: Path):
+    with _lock:
+        events = list(_events)
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+@contextmanager
+def trace_session(path: Path | Callable[[], Path]):
+    """Collect spans for the block and write them to `path`, even when it fails.
+
+    `path` may be a callable, resolved only at the end (e.g. before the project dir exists).
+    """
+    with _lock:
+        _events.clear(); _tags.clear()
+    try:
+        yield
+    finally:
+        path = path() if callable(path) else path
+        write_trace(path)
+        console.print(f"[grey]Trace written to {path} (summary: `agitegen profile`)")
+
+def load_events(path: Path) -> list[dict]:
+    data = json.loads(path.read_text())
+    return data["traceEvents"] if isinstance(data, dict) else data
+
+def print_summary(events: list[dict]):
+    """Per-phase count / total / mean / max, plus token and cost totals, slowest first."""
+    rows: dict[str, dict] = defaultdict(lambda: {"n": 0, "total": 0.0, "max": 0.0, "tokens": 0, "cost": 0.0})
+    for ev in events:
+        if ev.get("ph") != "X": continue
+        r = rows[ev["name"]]
+        dur = ev.get("dur", 0) / 1e6
+        r["n"] += 1; r["total"] += dur; r["max"] = max(r["max"], dur)
+        args = ev.get("args", {})
+        r["tokens"] += int(args.get("tokens_sent", 0)) + int(args.get("tokens_received", 0))
+        r["cost"] += float(args.get("cost", 0.0))
+    table = Table(title="Phase timings", show_edge=False)
+    for col in ("phase", "count", "total", "mean", "max", "tokens", "cost"):
+        table.add_column(col, justify="left" if col == "phase" else "right")
+    for name, r in sorted(rows.items(), key=lambda kv: kv[1]["total"], reverse=True):
+        table.add_row(name, str(r["n"]), f"{r['total']:.2f}s", f"{r['total']/r['n']:.2f}s", f"{r['max']:.2f}s",
+                      str(r["tokens"] or "-"), f"${r['cost']:.4f}" if r["cost"] else "-")
+    console.print(table)
+    passes = [ev for ev in events if ev.get("name") == "aider"]
+    if passes:
+        console.print("[bold]Aider passes")
+        for ev in passes:
+            a = ev.get("args", {})
+            console.print(f"  pass {a.get('pass_no', '?')} · {a.get('model', '?')} · {ev['dur']/1e6:.1f}s · "
+                          f"{a.get('tokens_sent', '?')} sent / {a.get('tokens_received', '?')} received · "
+                          f"${a.get('cost', 0):.4f}")
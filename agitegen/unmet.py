@@ -1,36 +1,83 @@
-"""YAML-aware requirement checker with ripgrep JSON."""
+"""YAML-aware requirement checker: one pass over the tree for all symbols, cached per file."""
 
 from __future__ import annotations
-import json, subprocess, sys, textwrap, yaml
+import hashlib, json, os, sys, textwrap, yaml
 from pathlib import Path
-from .utils import console
+from typing import NamedTuple
+from .utils import console, list_files, read_text, state_dir
 
-def _ensure_rg():
+INDEX_FILE = "scan-index.json"
+
+class RequirementScan(NamedTuple):
+    unmet: list[str]
+    found: dict[str, list[tuple[str, int]]]   # symbol -> [(relative path, first line), ...]
+
+class _Matcher:
+    """Finds which symbols occur in a file's text, and on which line each first does."""
+    def __init__(self, symbols: list[str]):
+        self.symbols = list(dict.fromkeys(symbols))
+
+    def scan(self, text: str) -> dict[str, int]:
+        hits = {}
+        for s in self.symbols:
+            i = text.find(s)   # substring search is C-speed; one regex over all symbols is not
+            if i >= 0: hits[s] = text.count("\n", 0, i) + 1
+        return hits
+
+def _load_index(path: Path, digest: str) -> dict:
     try:
-        ver = subprocess.check_output(["rg","--version"], text=True)
-        if "13." in ver or "14." in ver: return "rg"
+        idx = json.loads(path.read_text())
+        if idx.get("symbols") == digest: return idx["files"]
     except Exception: pass
-    rg_bin = Path.home()/".agitegen/rg"
-    if not rg_bin.exists():
-        rg_bin.parent.mkdir(exist_ok=True)
-        url = "https://github.com/BurntSushi/ripgrep/releases/download/13.0.0/ripgrep-13.0.0-x86_64-unknown-linux-musl.tar.gz"
-        subprocess.run(f"curl -sL {url}|tar -xz --strip-components 1 -C {rg_bin.parent}", shell=True, check=True)
-    return str(rg_bin)
+    return {}
 
-RG = _ensure_rg()
+def _save_index(path: Path, digest: str, files: dict):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"symbols": digest, "files": files}))
+    os.replace(tmp, path)
 
-def unmet_requirements(root: Path):
+def scan_requirements(root: Path) -> RequirementScan:
+    """Match every requirement symbol against the project in a single pass.
+
+    Per-file hits are cached in `.agitegen/scan-index.json` keyed by mtime/size, so later
+    passes only re-read the files Aider actually touched.
+    """
     data = yaml.safe_load((root/"requirements.md").read_text())
-    unmet = []
     reqs = data.get("requirements") if isinstance(data, dict) else None
     if not isinstance(reqs, list):
         console.print("[yellow]requirements.md key 'requirements' is not a list – skipping unmet requirements check.")
-        return unmet
-    for item in reqs:
-        if not isinstance(item, dict) or "symbol" not in item:
+        return RequirementScan([], {})
+    symbols = [str(item["symbol"]) for item in reqs if isinstance(item, dict) and item.get("symbol")]
+    if not symbols:
+        return RequirementScan([], {})
+
+    digest = hashlib.sha1("\0".join(sorted(set(symbols))).encode()).hexdigest()
+    index_path = state_dir(root) / INDEX_FILE
+    cached = _load_index(index_path, digest)
+    matcher = _Matcher(symbols)
+    files: dict[str, list] = {}
+    for path in list_files(root):
+        if path.name == "requirements.md" and path.parent == root:
+            continue   # the spec itself names every symbol
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        rel = path.relative_to(root).as_posix()
+        entry = cached.get(rel)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            files[rel] = entry
             continue
-        sym = item["symbol"]
-        rg  = subprocess.run([RG,"--json","-F",sym,str(root)], capture_output=True, text=True)
-        if not rg.stdout.strip():
-            unmet.append(sym)
-    return unmet
+        text = read_text(path)
+        files[rel] = [st.st_mtime_ns, st.st_size, matcher.scan(text) if text else {}]
+    _save_index(index_path, digest, files)
+
+    found: dict[str, list[tuple[str, int]]] = {}
+    for rel in sorted(files):
+        for sym, line in files[rel][2].items():
+            found.setdefault(sym, []).append((rel, line))
+    unmet = [s for s in dict.fromkeys(symbols) if s not in found]
+    return RequirementScan(unmet, found)
+
+def unmet_requirements(root: Path):
+    return scan_requirements(root).unmet
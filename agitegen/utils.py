@@ -1,5 +1,5 @@
 from __future__ import annotations
-import os, platform, shutil, subprocess, sys
+import functools, os, platform, shutil, signal, subprocess, sys, time
 from pathlib import Path
 from typing import Sequence
 from rich.console import Console
@@ -23,3 +23,110 @@ def ensure_env(var: str):
 
 def is_mac() -> bool:
     return platform.system() == "Darwin"
+
+def cache_home(*parts: str) -> Path:
+    """Shared cross-project cache dir (`~/.agitegen/` unless AGITEGEN_CACHE_DIR is set)."""
+    d = Path(os.getenv("AGITEGEN_CACHE_DIR") or Path.home() / ".agitegen").joinpath(*parts)
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def state_dir(root: Path) -> Path:
+    """Per-project scratch dir (`.agitegen/`) for caches and logs; git-ignores itself."""
+    d = root / ".agitegen"
+    if not d.exists():
+        d.mkdir(parents=True, exist_ok=True)
+        (d / ".gitignore").write_text("*\n")
+    return d
+
+def copy_tree(src: Path, dst: Path, link_all: bool = False):
+    """Copy `src` into `dst`, hard-linking anything under node_modules – or everything with
+    `link_all` – and falling back to a copy where links aren't possible."""
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = Path(dirpath).relative_to(src)
+        target = dst / rel
+        target.mkdir(parents=True, exist_ok=True)
+        link = link_all or "node_modules" in rel.parts
+        for name in list(dirnames):
+            if os.path.islink(os.path.join(dirpath, name)):   # os.walk lists symlinked dirs but won't descend
+                dirnames.remove(name)
+                filenames.append(name)
+        for name in filenames:
+            s, d = os.path.join(dirpath, name), target / name
+            if os.path.islink(s):
+                os.symlink(os.readlink(s), d)
+                continue
+            if link:
+                try:
+                    os.link(s, d)
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(s, d)
+
+_WALK_SKIP = {"node_modules", "build", "dist", "embeddings"}   # only used when rg is unavailable
+
+@functools.lru_cache(maxsize=None)
+def _ensure_rg() -> str | None:
+    """Resolve (or download) a ripgrep >= 13 once per process, on first use; None (also
+    cached, so the download isn't retried on every scan) when neither works."""
+    try:
+        ver = subprocess.check_output(["rg","--version"], text=True)
+        if "13." in ver or "14." in ver: return "rg"
+    except Exception: pass
+    rg_bin = Path.home()/".agitegen/rg"
+    if not rg_bin.exists():
+        rg_bin.parent.mkdir(exist_ok=True)
+        url = "https://github.com/BurntSushi/ripgrep/releases/download/13.0.0/ripgrep-13.0.0-x86_64-unknown-linux-musl.tar.gz"
+        try:
+            subprocess.run(f"curl -sL {url}|tar -xz --strip-components 1 -C {rg_bin.parent}", shell=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return str(rg_bin) if rg_bin.exists() else None
+
+def list_files(root: Path) -> list[Path]:
+    """Same file set `rg` searches: respects .gitignore, skips hidden and binary files."""
+    rg = _ensure_rg()
+    try:
+        if rg is None: raise OSError("ripgrep unavailable")
+        out = subprocess.run([rg, "--files", str(root)], capture_output=True, text=True).stdout
+        return [Path(p) for p in out.splitlines() if p]
+    except (OSError, subprocess.CalledProcessError):
+        files = []
+        for d, dirs, names in os.walk(root):
+            dirs[:] = [x for x in dirs if not x.startswith(".") and x not in _WALK_SKIP]
+            files += [Path(d)/n for n in names if not n.startswith(".")]
+        return files
+
+def read_text(path: Path) -> str | None:
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if b"\0" in data[:8192]: return None   # binary, rg would skip it too
+    return data.decode("utf-8", errors="ignore")
+
+def terminate_group(proc: subprocess.Popen, grace: float = 10):
+    """SIGTERM the process group `proc` leads (started with start_new_session=True) and
+    SIGKILL what is left after `grace` seconds – also when the leader itself already exited."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return # Process group already gone
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline:
+        if proc.poll() is not None and not _group_alive(proc.pid):
+            return
+        time.sleep(0.1)
+    console.print("[yellow]Process group did not terminate gracefully, killing.")
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
@@ -0,0 +1,194 @@
+"""`agitegen watch`: keep requirement and test status current while you edit.
+
+File changes arrive through watchdog (inotify / FSEvents / ReadDirectoryChangesW; install
+with `pip install "agitegen[watch]"`) or, without it, by polling mtimes every POLL_INTERVAL.
+Once edits have been quiet for DEBOUNCE seconds, the requirement scan (cached per file) and
+the affected test steps (see `impact.py`) rerun concurrently, with backend services kept
+warm between runs. When the affected steps pass, the full suite only runs to confirm once
+nothing has changed for CONFIRM_IDLE seconds.
+
+After every run the result is written to `.agitegen/watch-state.json` together with the
+working-tree snapshot it describes. `build` reads it: if the tree is still exactly that
+snapshot and it was green after a full (confirmed) run, the build is done without
+rescanning or retesting.
+"""
+
+from __future__ import annotations
+import asyncio, json, os, threading, time
+from pathlib import Path
+from rich.panel import Panel
+from .engine import all_of, stage
+from .failures import extract_failures
+from .impact import TestImpact, snapshot
+from .tester import run_local_tests
+from .unmet import scan_requirements
+from .utils import console, state_dir
+
+STATE_FILE    = "watch-state.json"
+DEBOUNCE      = 0.5    # seconds without further changes before a run starts
+POLL_INTERVAL = 1.0
+CONFIRM_IDLE  = 5.0    # seconds without changes before a green narrowed run is confirmed in full
+_IGNORED = {".git", ".agitegen", "node_modules", "build", "dist", ".dart_tool", ".expo", "coverage",
+            "ios", "android", "embeddings"}
+
+def _ignored(root: Path, path: str) -> bool:
+    try:
+        parts = Path(path).relative_to(root).parts
+    except ValueError:
+        return True
+    return not parts or any(p in _IGNORED for p in parts[:-1]) or parts[-1].startswith(".aider")
+
+class _Changes:
+    """Changed paths collected from the watcher thread, handed out in debounced batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths: set[str] = set()
+        self._last = 0.0
+        self._event = threading.Event()
+
+    def add(self, path: str):
+        with self._lock:
+            self._paths.add(path)
+            self._last = time.monotonic()
+        self._event.set()
+
+    def next_batch(self, stop: threading.Event, idle: float | None = None) -> set[str] | None:
+        """The next debounced batch; None if nothing changed within `idle` seconds."""
+        give_up = None if idle is None else time.monotonic() + idle
+        while not stop.is_set():
+            if not self._event.wait(0.2):
+                if give_up is not None and time.monotonic() >= give_up:
+                    return None
+                continue
+            with self._lock:
+                quiet = time.monotonic() - self._last
+                if quiet >= DEBOUNCE:
+                    paths, self._paths = self._paths, set()
+                    self._event.clear()
+                    return paths
+            time.sleep(DEBOUNCE - quiet)
+        return set()
+
+def _start_watchdog(root: Path, changes: _Changes):
+    """An observer feeding `changes`, or None when watchdog isn't installed."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.event_type in ("opened", "closed_no_write"):
+                return
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if path and not _ignored(root, path):
+                    changes.add(path)
+
+    observer = Observer()
+    observer.schedule(Handler(), str(root), recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def _stat_tree(root: Path) -> dict[str, tuple[int, int]]:
+    seen = {}
+    for d, dirs, names in os.walk(root):
+        dirs[:] = [x for x in dirs if x not in _IGNORED]
+        for n in names:
+            path = os.path.join(d, n)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen[path] = (st.st_mtime_ns, st.st_size)
+    return seen
+
+def _poll(root: Path, changes: _Changes, stop: threading.Event):
+    before = _stat_tree(root)
+    while not stop.wait(POLL_INTERVAL):
+        now = _stat_tree(root)
+        for path in now.keys() ^ before.keys() | {p for p in now.keys() & before.keys() if now[p] != before[p]}:
+            if not _ignored(root, path):
+                changes.add(path)
+        before = now
+
+# -- shared state ------------------------------------------------------------------------
+def _write_state(root: Path, state: dict):
+    path = state_dir(root) / STATE_FILE
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+def known_state(root: Path, framework: str, backend: str) -> dict | None:
+    """The last watch result if it describes the working tree exactly as it is now."""
+    try:
+        state = json.loads((state_dir(root) / STATE_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("framework") != framework or state.get("backend") != backend:
+        return None
+    tree = snapshot(root)
+    return state if tree is not None and state.get("tree") == tree else None
+
+# -- loop ----------------------------------------------------------------------------------
+def _check(root: Path, framework: str, backend: str, impact: TestImpact, changed: set[str],
+           confirm: bool) -> dict:
+    tree = snapshot(root)
+    t0 = time.monotonic()
+
+    async def both():
+        return await all_of(stage("unmet_requirements", scan_requirements, root),
+                            stage("run_local_tests", run_local_tests, root, framework, backend,
+                                  impact=impact, confirm=confirm, cancellable=True))
+    scan, (tests_ok, log) = asyncio.run(both())
+    failures, unparsed = extract_failures(log) if not tests_ok else ([], {})
+    state = {
+        "tree": tree, "framework": framework, "backend": backend, "pid": os.getpid(), "updated": time.time(),
+        "green": tests_ok and impact.confirmed and not scan.unmet, "tests_ok": tests_ok,
+        "confirmed": impact.confirmed, "unmet": scan.unmet,
+        "met": sorted(scan.found), "failures": [f"{f.file or f.tool}:{f.line or ''} {f.message.splitlines()[0] if f.message else ''}"
+                                                for f in failures][:20] + [f"{step}: failed" for step in unparsed],
+        "seconds": round(time.monotonic() - t0, 2), "changed": sorted(os.path.relpath(p, root) for p in changed)[:50],
+    }
+    if tree is not None and snapshot(root) == tree:   # otherwise a newer batch is already queued
+        _write_state(root, state)
+    return state
+
+def _status(state: dict) -> Panel:
+    met, unmet = len(state["met"]), len(state["unmet"])
+    lines = [f"requirements: {met}/{met + unmet} met" + (f" – missing {', '.join(state['unmet'][:8])}" if unmet else ""),
+             f"tests: {'[green]passing' if state['tests_ok'] else '[red]failing'}[/] ({state['seconds']:.1f}s)"
+             + ("" if state["confirmed"] or not state["tests_ok"] else " – affected steps only, full run once idle")]
+    lines += [f"  [red]•[/] {f}" for f in state["failures"][:8]]
+    if state["changed"]:
+        lines.append(f"[grey]after changes to {', '.join(state['changed'][:5])}{' …' if len(state['changed']) > 5 else ''}")
+    title = ("[green]GREEN" if state["green"] else "[yellow]GREEN (unconfirmed)"
+             if state["tests_ok"] and not state["unmet"] else "[red]NOT GREEN")
+    return Panel("\n".join(lines), title=f"{title}[/] · {time.strftime('%H:%M:%S')}", border_style="dim blue")
+
+def watch(root: Path, framework: str, backend: str):
+    from .logs import log_session
+    from .services import service_session
+    changes, stop = _Changes(), threading.Event()
+    observer = _start_watchdog(root, changes)
+    if observer is None:
+        console.print(f"[grey]watchdog not installed – polling every {POLL_INTERVAL:.0f}s (pip install \"agitegen[watch]\")")
+        threading.Thread(target=_poll, args=(root, changes, stop), daemon=True).start()
+    impact = TestImpact(root)
+    try:
+        with service_session(), log_session():
+            changed: set[str] | None = set()
+            while True:
+                # a quiet period after an unconfirmed green run (changed is None) runs the full suite
+                state = _check(root, framework, backend, impact, changed or set(), confirm=changed is None)
+                console.print(_status(state))
+                console.print("[grey]Watching for changes – Ctrl-C to stop")
+                changed = changes.next_batch(stop, CONFIRM_IDLE if state["tests_ok"] and not state["confirmed"] else None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if observer is not None:
+            observer.stop()
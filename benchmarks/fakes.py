@@ -0,0 +1,178 @@
+"""Scripted stand-ins for the external tools the build loop shells out to.
+
+    python benchmarks/fakes.py <tool> [args...]       # tool: aider npm npx flutter docker gh rg
+
+`install(bin_dir, state_dir, script)` writes one shim per tool into `bin_dir`; put it first
+on PATH. Behaviour is read from `state_dir/script.json`:
+
+    {"latency": {"aider": 0.2, "unit": 0.05, ...},      # seconds slept per call
+     "exit":    {"unit": [1, 0], "aider": [0]},         # exit code of the n-th call (last repeats)
+     "output_lines": 200}                               # filler lines written by test commands
+
+Keys are tools or test steps: aider, lint, unit, integration, docker, gh. Every call is
+appended to `state_dir/calls.log`.
+"""
+
+from __future__ import annotations
+import json, os, re, signal, subprocess, sys, time
+from pathlib import Path
+
+TOOLS = ("aider", "npm", "npx", "flutter", "docker", "gh", "rg")
+USAGE = "Tokens: 12k sent, 1.1k received. Cost: $0.05 message, $0.12 session."
+
+def install(bin_dir: Path, state_dir: Path, script: dict):
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    (state_dir / "script.json").write_text(json.dumps(script))
+    for tool in TOOLS:
+        shim = bin_dir / tool
+        shim.write_text(f'#!/bin/sh\nAGITEGEN_FAKE_STATE="{state_dir}" exec "{sys.executable}" '
+                        f'"{Path(__file__).resolve()}" {tool} "$@"\n')
+        shim.chmod(0o755)
+
+def calls(state_dir: Path) -> list[str]:
+    try:
+        return (state_dir / "calls.log").read_text().splitlines()
+    except OSError:
+        return []
+
+# -- scripted behaviour ---------------------------------------------------------------
+class _Script:
+    def __init__(self):
+        self.dir = Path(os.environ["AGITEGEN_FAKE_STATE"])
+        self.data = json.loads((self.dir / "script.json").read_text())
+
+    def call(self, key: str, argv: list[str]) -> int:
+        """Log the call, sleep the scripted latency, return the scripted exit code."""
+        with open(self.dir / f"{key}.count", "ab") as counter:   # one byte per call: safe across processes
+            counter.write(b".")
+            n = counter.tell() - 1
+        with open(self.dir / "calls.log", "a") as log:
+            log.write(f"{key} {' '.join(argv)}\n")
+        time.sleep(self.data.get("latency", {}).get(key, 0))
+        codes = self.data.get("exit", {}).get(key) or [0]
+        return codes[min(n, len(codes) - 1)]
+
+def _filler(n: int, label: str):
+    for i in range(n):
+        print(f"  {label} … checked module {i:05d}")
+
+def _test(script: _Script, step: str, argv: list[str], flutter: bool) -> int:
+    code = script.call(step, argv)
+    _filler(script.data.get("output_lines", 200), step)
+    if code == 0:
+        print("All tests passed!" if flutter else "Tests: 12 passed, 12 total")
+        return 0
+    if step == "lint" and flutter:
+        print("  error • Undefined name 'featureStore' • lib/features/feature_0001.dart:12:5 • undefined_identifier")
+    elif step == "lint":
+        print(f"{Path.cwd()}/src/features/feature0001.ts")
+        print("  12:5  error  'featureStore' is not defined  no-undef")
+    elif flutter:
+        print("00:02 +3 -1: test/widget_test.dart: renders the home screen [E]")
+        print("  Expected: exactly one matching node")
+        print("test/widget_test.dart 14:5  main.<fn>")
+        print("00:03 +3 -1: Some tests failed.")
+    else:
+        print("FAIL src/features/feature0001.test.ts")
+        print("  ● feature0001 › returns the stored value")
+        print("    expect(received).toBe(expected)")
+        print("      at Object.<anonymous> (src/features/feature0001.test.ts:14:5)")
+        print("Tests: 1 failed, 11 passed, 12 total")
+    return code
+
+def aider(script: _Script, argv: list[str]) -> int:
+    """Implements every unmet symbol from `--message` in src/ (or lib/), then prints a usage footer."""
+    code = script.call("aider", argv)
+    msg = json.loads(argv[argv.index("--message") + 1]) if "--message" in argv else {}
+    unmet = msg.get("unmet", [])
+    if unmet and code == 0:
+        flutter = Path("pubspec.yaml").exists()
+        n = (script.dir / "aider.count").stat().st_size
+        path = Path("lib" if flutter else "src") / (f"aider_impl_{n}.dart" if flutter else f"aider_impl_{n}.ts")
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("".join((f"final {s} = 1;\n" if flutter else f"export const {s} = 1;\n") for s in unmet))
+    print(f"Applied edit for {len(unmet)} symbol(s)")
+    print(USAGE)
+    return code
+
+def npm(script: _Script, argv: list[str]) -> int:
+    if argv[:2] == ["run", "lint"]:
+        return _test(script, "lint", argv, flutter=False)
+    if argv[:2] == ["run", "test:int"]:
+        return _test(script, "integration", argv, flutter=False)
+    if argv[:1] == ["test"]:
+        return _test(script, "unit", argv, flutter=False)
+    return script.call("npm", argv)
+
+def npx(script: _Script, argv: list[str]) -> int:
+    if argv[:1] == ["eslint"]:
+        return _test(script, "lint", argv, flutter=False)
+    return script.call("npx", argv)
+
+def flutter(script: _Script, argv: list[str]) -> int:
+    if argv[:1] == ["analyze"]:
+        return _test(script, "lint", argv, flutter=True)
+    if argv[:1] == ["test"]:
+        return _test(script, "integration" if "integration_test" in argv else "unit", argv, flutter=True)
+    return script.call("flutter", argv)
+
+def docker(script: _Script, argv: list[str]) -> int:
+    """`run -d` serves HTTP on the first `-p` host port (a local http.server) until `rm -f`."""
+    code = script.call("docker", argv)
+    if code or not argv:
+        return code
+    if argv[0] == "info":
+        print(f"Docker Root Dir: {script.dir}")
+    elif argv[0] == "run":
+        name = argv[argv.index("--name") + 1]
+        port = next(a.split(":")[0] for a in argv[argv.index("-p") + 1:] if re.match(r"\d+:\d+", a))
+        proc = subprocess.Popen([sys.executable, "-m", "http.server", port, "--bind", "127.0.0.1"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        pid_file = script.dir / f"container-{name}.pid"
+        pid_file.write_text(str(proc.pid))
+        print(f"{proc.pid:064x}")
+    elif argv[0] == "inspect":
+        pid_file = script.dir / f"container-{argv[-1]}.pid"
+        print("true" if pid_file.exists() and _alive(int(pid_file.read_text())) else "false")
+    elif argv[:2] == ["rm", "-f"]:
+        pid_file = script.dir / f"container-{argv[-1]}.pid"
+        if pid_file.exists():
+            try:
+                os.kill(int(pid_file.read_text()), signal.SIGTERM)
+            except OSError:
+                pass
+            pid_file.unlink()
+    return 0
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def gh(script: _Script, argv: list[str]) -> int:
+    code = script.call("gh", argv)
+    if code == 0 and argv[:1] == ["api"]:
+        print("120")
+    return code
+
+def rg(script: _Script, argv: list[str]) -> int:
+    """Just enough ripgrep for `unmet`: `--version` and `--files <root>` (skipping hidden/ignored dirs)."""
+    if "--version" in argv:
+        print("ripgrep 14.1.0")
+        return 0
+    script.call("rg", argv)
+    root = argv[argv.index("--files") + 1] if len(argv) > argv.index("--files") + 1 else "."
+    for d, dirs, names in os.walk(root):
+        dirs[:] = sorted(x for x in dirs if not x.startswith(".") and x != "node_modules")
+        for n in sorted(names):
+            if not n.startswith("."):
+                print(os.path.join(d, n))
+    return 0
+
+if __name__ == "__main__":
+    tool, args = sys.argv[1], sys.argv[2:]
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.exit(globals()[tool](_Script(), args))
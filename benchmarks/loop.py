@@ -0,0 +1,201 @@
+"""Offline benchmark of the build loop's hot paths across project sizes.
+
+    python benchmarks/loop.py [--sizes 100,1000,5000] [--repeat 3] [--json out.json]
+                              [--compare previous.json --max-regression 25]
+
+Every size gets a synthetic project (`synth.py`) and scripted stand-ins for aider, npm,
+flutter, docker, gh and rg (`fakes.py`) first on PATH, so nothing touches the network and
+tool latency is fixed. Phases:
+
+  scan:cold / scan:warm / scan:touched   `unmet_requirements` without index, unchanged, one file edited
+  tests:full                             `run_local_tests` with a failing unit step
+  loop                                   `run_aider_until_green` to green (2 passes), plus one row
+                                         per traced span inside it (`loop › aider`, ...)
+  quota:github                           `ensure_github_minutes` against the fake `gh`
+
+Wall time is the median of --repeat runs on a fresh copy of the project; peak memory is
+the tracemalloc peak of one extra run (Python allocations only). Each fake call costs its
+scripted latency plus one interpreter start-up; the rest is AgiteGen's own overhead.
+"""
+
+from __future__ import annotations
+import argparse, contextlib, io, json, os, platform, shutil, statistics, sys, tempfile, time, tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import fakes, synth   # noqa: E402
+
+SCRIPT = {
+    "latency": {"aider": 0.05, "lint": 0.01, "unit": 0.02, "integration": 0.02, "gh": 0.01},
+    "exit": {"unit": [1, 0]},          # first unit run fails, so the loop needs a repair pass
+    "output_lines": 500,
+}
+
+@dataclass
+class Phase:
+    name: str
+    run: Callable[[Path], object]
+    setup: Callable[[Path], object] = lambda root: None
+
+def _phases(framework: str, backend: str) -> list[Phase]:
+    from agitegen.llm import run_aider_until_green
+    from agitegen.logs import log_session
+    from agitegen.quota import ensure_github_minutes
+    from agitegen.services import service_session
+    from agitegen.tester import run_local_tests
+    from agitegen.unmet import unmet_requirements
+
+    def touch_one(root: Path):
+        unmet_requirements(root)
+        first = next((root / ("src" if framework == "rn" else "lib") / "features").iterdir())
+        first.write_text(first.read_text() + "// edited\n")
+
+    def loop(root: Path):
+        with service_session(), log_session():
+            run_aider_until_green(root, backend)
+
+    def tests(root: Path):
+        with service_session(), log_session():
+            run_local_tests(root, framework, backend)
+
+    return [
+        Phase("scan:cold", unmet_requirements),
+        Phase("scan:warm", unmet_requirements, setup=unmet_requirements),
+        Phase("scan:touched", unmet_requirements, setup=touch_one),
+        Phase("tests:full", tests),
+        Phase("loop", loop),
+        Phase("quota:github", lambda root: ensure_github_minutes(max_age=0)),
+    ]
+
+@contextlib.contextmanager
+def _cwd(path: Path):
+    """`agitegen build` runs from the project dir (Aider edits `.`)."""
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+def _reset_fakes(state: Path):
+    for f in [*state.glob("*.count"), state / "calls.log"]:
+        f.unlink(missing_ok=True)
+
+def measure(phase: Phase, pristine: Path, work: Path, state: Path, repeat: int, quiet: bool,
+            trace_path: Path) -> dict:
+    from agitegen.trace import load_events, trace_session
+    times, peak, spans = [], 0, {}
+    for i in range(repeat + 1):               # the last run is the tracemalloc one
+        root = work / f"{phase.name.replace(':', '-')}-{i}"
+        shutil.copytree(pristine, root, symlinks=True)
+        _reset_fakes(state)
+        sink = io.StringIO()
+        with _cwd(root), contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            phase.setup(root)
+            traced = i == repeat - 1 and phase.name == "loop"
+            with trace_session(trace_path) if traced else contextlib.nullcontext():
+                if i == repeat:
+                    tracemalloc.start()
+                t0 = time.perf_counter()
+                try:
+                    phase.run(root)
+                except SystemExit as e:
+                    raise RuntimeError(f"{phase.name} exited with {e.code}:\n{sink.getvalue()[-2000:]}") from e
+                elapsed = time.perf_counter() - t0
+                if i == repeat:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                else:
+                    times.append(elapsed)
+        if traced:
+            for ev in load_events(trace_path):
+                spans.setdefault(ev["name"], []).append(ev["dur"] / 1e6)
+        shutil.rmtree(root, ignore_errors=True)
+    return {"seconds": statistics.median(times), "min": min(times), "peak_kb": peak // 1024,
+            "spans": {k: sum(v) for k, v in spans.items()}, "calls": fakes.calls(state)}
+
+def run(sizes: list[int], repeat: int, file_kb: float, requirements: int, framework: str,
+        backend: str, quiet: bool) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="agitegen-bench-") as tmp:
+        tmp = Path(tmp)
+        state = tmp / "fake-state"
+        fakes.install(tmp / "bin", state, SCRIPT)
+        os.environ["PATH"] = f"{tmp / 'bin'}{os.pathsep}{os.environ['PATH']}"
+        os.environ["AGITEGEN_CACHE_DIR"] = str(tmp / "cache")
+        os.environ["AGITEGEN_AIDER_MODE"] = "cli"   # the fake aider, even where aider is importable
+        os.environ.pop("AGITEGEN_FAIL_FAST", None)
+        os.environ.pop("AGITEGEN_VERBOSE", None)
+        phases = _phases(framework, backend)
+        for files in sizes:
+            pristine = synth.generate(tmp / f"project-{files}", files, file_kb, requirements,
+                                      framework=framework)
+            work = tmp / f"work-{files}"
+            work.mkdir()
+            for phase in phases:
+                r = measure(phase, pristine, work, state, repeat, quiet, tmp / "trace.json")
+                results.append({"files": files, "phase": phase.name, "seconds": r["seconds"],
+                                "min": r["min"], "peak_kb": r["peak_kb"]})
+                for name, secs in sorted(r["spans"].items()):
+                    if name != "pass":
+                        results.append({"files": files, "phase": f"loop › {name}", "seconds": secs})
+                print(f"  {files:>6} files  {phase.name:<14} {r['seconds'] * 1000:8.1f} ms  "
+                      f"peak {r['peak_kb']:>7} KiB  ({len(r['calls'])} tool calls)", file=sys.stderr)
+            shutil.rmtree(pristine, ignore_errors=True)
+    return results
+
+def report(results: list[dict], baseline: list[dict] | None = None) -> list[tuple[float, dict]]:
+    """Print the table; returns (% slower than `baseline`, row) for every row it has, worst first."""
+    old = {(r["files"], r["phase"]): r for r in baseline or []}
+    deltas = []
+    print(f"{'phase':<28} {'files':>7} {'median':>10} {'peak':>10} {'vs base':>9}")
+    for r in results:
+        base = old.get((r["files"], r["phase"]))
+        delta = (r["seconds"] / base["seconds"] - 1) * 100 if base and base["seconds"] else None
+        peak = f"{r['peak_kb']:,} K" if "peak_kb" in r else ""
+        print(f"{r['phase']:<28} {r['files']:>7} {r['seconds'] * 1000:>8.1f}ms {peak:>10} "
+              f"{'' if delta is None else f'{delta:+.0f}%':>9}")
+        if delta is not None:
+            deltas.append((delta, r))
+    return sorted(deltas, key=lambda d: d[0], reverse=True)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="100,1000,5000", help="comma-separated file counts")
+    ap.add_argument("--file-kb", type=float, default=4)
+    ap.add_argument("--requirements", type=int, default=100)
+    ap.add_argument("--framework", choices=["rn", "flutter"], default="rn")
+    ap.add_argument("--backend", choices=["none", "supabase"], default="none",
+                    help="supabase exercises service start-up through the fake docker")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", help="write the measurements to this file")
+    ap.add_argument("--compare", help="previous --json output to diff against")
+    ap.add_argument("--max-regression", type=float, help="fail if a top-level phase got this %% slower")
+    ap.add_argument("--verbose", action="store_true", help="show agitegen's own output")
+    args = ap.parse_args(argv)
+
+    if args.repeat < 1:
+        ap.error("--repeat must be at least 1")
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = run(sizes, args.repeat, args.file_kb, args.requirements, args.framework,
+                  args.backend, quiet=not args.verbose)
+    baseline = json.loads(Path(args.compare).read_text())["results"] if args.compare else None
+    deltas = report(results, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "python": platform.python_version(), "platform": platform.platform(),
+            "params": vars(args), "script": SCRIPT, "results": results,
+        }, indent=2))
+    if args.max_regression is not None:
+        # span rows inside `loop` are single samples – too noisy to gate on
+        bad = [(d, r) for d, r in deltas if d > args.max_regression and "peak_kb" in r]
+        for d, r in bad:
+            print(f"regressed: {r['phase']} @ {r['files']} files {d:+.0f}%")
+        if bad:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
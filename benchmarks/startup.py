@@ -0,0 +1,65 @@
+"""Cold-start budget for `agitegen --help`; exits non-zero when it regresses.
+
+    python benchmarks/startup.py [--runs 7] [--budget-ms 800] [--json out.json]
+
+Two checks: the median wall time of fresh `python -m agitegen.cli --help` processes must
+stay under the budget, and `python -X importtime` must show none of the heavy modules
+that only real commands need.
+"""
+
+from __future__ import annotations
+import argparse, json, statistics, subprocess, sys, time
+
+HELP_CMD = [sys.executable, "-m", "agitegen.cli", "--help"]
+HEAVY = ("httpx", "yaml", "jinja2", "chromadb", "openai", "agitegen.llm", "agitegen.unmet",
+         "agitegen.quota", "agitegen.scaffolder", "agitegen.embed", "agitegen.tester")
+
+def wall_times(runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(HELP_CMD, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+def import_profile() -> dict[str, int]:
+    """Cumulative import time (µs) per module, from `-X importtime`."""
+    err = subprocess.run([sys.executable, "-X", "importtime", *HELP_CMD[1:]],
+                         capture_output=True, text=True).stderr
+    cumulative = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cum, name = (p.strip() for p in line[len("import time:"):].split("|"))
+        if cum.isdigit(): cumulative[name] = int(cum)
+    return cumulative
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--budget-ms", type=float, default=800)
+    ap.add_argument("--json", help="write the measurements to this file")
+    args = ap.parse_args(argv)
+
+    times = wall_times(args.runs)
+    profile = import_profile()
+    median = statistics.median(times)
+    heavy = sorted(m for m in profile if m in HEAVY)
+    top = sorted(profile.items(), key=lambda kv: kv[1], reverse=True)[:10]
+
+    print(f"agitegen --help: median {median:.0f} ms, min {min(times):.0f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+    for name, us in top:
+        print(f"  {us/1000:8.1f} ms  {name}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"median_ms": median, "runs_ms": times, "imports_us": profile}, f, indent=2)
+
+    ok = True
+    if heavy:
+        print(f"FAIL: --help imported heavy modules: {', '.join(heavy)}"); ok = False
+    if median > args.budget_ms:
+        print(f"FAIL: median {median:.0f} ms exceeds budget {args.budget_ms:.0f} ms"); ok = False
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
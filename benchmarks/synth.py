@@ -0,0 +1,87 @@
+"""Synthetic AgiteGen projects of a given size, for the loop benchmark.
+
+    python benchmarks/synth.py OUT --files 1000 --file-kb 4 --requirements 100
+
+Writes an Expo-style (`rn`) or Flutter tree: feature modules that import each other, their
+tests, a `requirements.md` whose symbols are partly implemented already (`--implemented`),
+and a git repo with everything committed so test impact analysis has a baseline.
+"""
+
+from __future__ import annotations
+import argparse, json, random, subprocess
+import yaml
+from pathlib import Path
+
+def _symbol(i: int, framework: str) -> str:
+    return f"useFeature{i:04d}Store" if framework == "rn" else f"feature{i:04d}Store"
+
+def _module(i: int, files: int, size: int, framework: str, rng: random.Random, exports: list[str]) -> str:
+    deps = sorted({rng.randrange(files) for _ in range(3)} - {i})
+    if framework == "rn":
+        head = [f"import {{ value{d:04d} }} from './feature{d:04d}';" for d in deps]
+        body = [f"export const value{i:04d} = {i};", *(f"export const {s} = () => value{i:04d};" for s in exports)]
+        filler = "// {n}: keeps the module at its target size – lorem ipsum dolor sit amet\n"
+    else:
+        head = [f"import 'feature_{d:04d}.dart';" for d in deps]
+        body = [f"const value{i:04d} = {i};", *(f"int {s}() => value{i:04d};" for s in exports)]
+        filler = "// {n}: keeps the library at its target size – lorem ipsum dolor sit amet\n"
+    text = "\n".join(head + body) + "\n"
+    n = 0
+    while len(text) < size:
+        text += filler.format(n=n); n += 1
+    return text
+
+def generate(root: Path, files: int = 500, file_kb: float = 4, requirements: int = 50,
+             implemented: float = 0.5, framework: str = "rn", seed: int = 0) -> Path:
+    """Create the project at `root` (which must not exist) and return it."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True)
+    symbols = [_symbol(i, framework) for i in range(requirements)]
+    done = set(rng.sample(range(requirements), round(requirements * implemented)))
+    owners: dict[int, list[str]] = {}
+    for i in done:
+        owners.setdefault(rng.randrange(files), []).append(symbols[i])
+
+    if framework == "rn":
+        (root / "package.json").write_text(json.dumps({
+            "name": "bench-app", "private": True,
+            "scripts": {"lint": "eslint src", "test": "jest", "test:int": "jest -c jest.int.config.js"},
+        }, indent=2))
+        src, tests, ext = root / "src" / "features", root / "src" / "features", "ts"
+        name = lambda i: f"feature{i:04d}"
+    else:
+        (root / "pubspec.yaml").write_text("name: bench_app\nenvironment:\n  sdk: '>=3.0.0 <4.0.0'\n")
+        src, tests, ext = root / "lib" / "features", root / "test", "dart"
+        name = lambda i: f"feature_{i:04d}"
+    src.mkdir(parents=True); tests.mkdir(parents=True, exist_ok=True)
+    size = int(file_kb * 1024)
+    for i in range(files):
+        (src / f"{name(i)}.{ext}").write_text(_module(i, files, size, framework, rng, owners.get(i, [])))
+        if i % 10 == 0:   # one test per ten modules, like a real app's uneven coverage
+            test = f"{name(i)}.test.ts" if framework == "rn" else f"{name(i)}_test.dart"
+            (tests / test).write_text(f"// exercises {name(i)}\n")
+
+    reqs = [{"symbol": s, "desc": f"Requirement {i}"} for i, s in enumerate(symbols)]
+    (root / "requirements.md").write_text(yaml.safe_dump({"requirements": reqs}, sort_keys=False))
+    (root / ".gitignore").write_text("node_modules/\nembeddings/\n")
+    git = lambda *a: subprocess.run(["git", *a], cwd=root, capture_output=True, check=True)
+    git("init", "-q")
+    git("add", "-A")
+    git("-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "synthetic baseline")
+    return root
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--files", type=int, default=500)
+    ap.add_argument("--file-kb", type=float, default=4)
+    ap.add_argument("--requirements", type=int, default=50)
+    ap.add_argument("--implemented", type=float, default=0.5, help="fraction of symbols already present")
+    ap.add_argument("--framework", choices=["rn", "flutter"], default="rn")
+    ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args(argv)
+    generate(a.out, a.files, a.file_kb, a.requirements, a.implemented, a.framework, a.seed)
+    print(f"wrote {a.out}")
+
+if __name__ == "__main__":
+    main()